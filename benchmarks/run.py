@@ -0,0 +1,227 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Benchmarks of the drive control hot path, running on the HAL simulation (no XRP needed).
+
+    python -m benchmarks.run --save      # measure and save the results as the baseline
+    python -m benchmarks.run             # measure and compare with the baseline (exit code 1 if slower)
+
+The baseline is machine specific: save it on the same computer where you compare.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import commands2
+from wpilib.simulation import resumeTiming
+
+from utils.clock import clock
+
+kBaselineFile = os.path.join(os.path.dirname(__file__), "baseline.json")
+kPeriod = 0.02
+kMaxRoutineSeconds = 30.0  # (simulated) the autonomous routine must finish in this time, or the robot isn't moving
+
+benchmarks = {}
+
+
+def benchmark(name: str):
+    """Register a function(robot) -> callable to be timed"""
+    def register(setup):
+        benchmarks[name] = setup
+        return setup
+    return register
+
+
+class SimulatedRobot:
+    """One RobotContainer and a plant model, shared by all benchmarks (HAL devices can only be made once)"""
+
+    def __init__(self):
+        from robotcontainer import RobotContainer
+        from sim.headless import enableAutonomous
+        from sim.xrpplant import XRPPlant
+
+        self.clock = clock.useVirtual()
+        enableAutonomous()
+        self.container = RobotContainer()
+        self.drivetrain = self.container.drivetrain
+        self.plant = XRPPlant()
+        self.scheduler = commands2.CommandScheduler.getInstance()
+
+    def newPlant(self):
+        from sim.xrpplant import XRPPlant
+        self.scheduler.cancelAll()
+        self.plant = XRPPlant()
+        self.drivetrain.resetOdometry()
+        return self.plant
+
+    def tick(self) -> None:
+        self.plant.update(kPeriod)
+        self.clock.step(kPeriod)
+        clock.tick()
+        self.scheduler.run()
+
+
+@benchmark("to_left_right_speeds")
+def _toLeftRightSpeeds(robot):
+    from subsystems.drivetrain import _to_left_right_speeds
+    return lambda: _to_left_right_speeds(0.7, 0.2)
+
+
+@benchmark("SigmaDeltaModulator.modulate")
+def _modulate(robot):
+    from subsystems.drivetrain import SigmaDeltaModulator
+    modulator = SigmaDeltaModulator(0.4)
+    return lambda: modulator.modulate(0.2)
+
+
+@benchmark("Drivetrain.arcadeDrive")
+def _arcadeDrive(robot):
+    return lambda: robot.drivetrain.arcadeDrive(0.7, 0.2)
+
+
+@benchmark("Drivetrain.periodic")
+def _drivetrainPeriodic(robot):
+    return robot.drivetrain.periodic
+
+
+@benchmark("GoToPoint.execute")
+def _goToPointExecute(robot):
+    from commands.gotopoint import GoToPoint
+    robot.newPlant()
+    command = GoToPoint(25, 10, robot.drivetrain, 1.0)
+    command.initialize()
+
+    def execute():
+        command.execute()
+        command.isFinished()
+    return execute
+
+
+@benchmark("scheduler tick (autonomous)")
+def _schedulerTick(robot):
+    def start():
+        robot.newPlant()
+        command = robot.container.getAutonomousCommand()
+        robot.scheduler.schedule(command)
+        return command
+
+    command = start()
+    ticks = 0
+
+    def tick():
+        nonlocal command, ticks
+        if not robot.scheduler.isScheduled(command):
+            command = start()  # (once the routine finished, start it over: idle ticks would look too fast)
+            ticks = 0
+        robot.tick()
+        ticks += 1
+        if ticks * kPeriod > kMaxRoutineSeconds:
+            # (a robot which doesn't move would never finish, and then this would be timing something else)
+            raise RuntimeError(f"the autonomous routine did not finish in {kMaxRoutineSeconds} simulated seconds")
+    return tick
+
+
+def timeAutonomous(robot, seconds: float = kMaxRoutineSeconds) -> dict:
+    """Run the whole autonomous routine from RobotContainer.getAutonomousCommand (as fast as possible)"""
+    from sim.headless import runAutonomous
+    robot.newPlant()
+    result = runAutonomous(robot.container, robot.plant, seconds=seconds, period=kPeriod)
+    if not result["finished"]:
+        raise RuntimeError(f"the autonomous routine did not finish in {seconds} simulated seconds")
+    ticks = max(1, round(result["simSeconds"] / kPeriod))
+    return {"seconds": result["wallSeconds"] / ticks, "ticks": ticks, "raceSeconds": result["simSeconds"]}
+
+
+def timeCall(function, repeat: int = 5, minSeconds: float = 0.2) -> float:
+    """:returns: seconds per call (best of `repeat` rounds, each round lasting at least minSeconds)"""
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= minSeconds / 10:
+            break
+        calls *= 2
+    calls = max(1, int(calls * minSeconds / max(elapsed, 1e-9)))
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def runAll(only=None) -> dict:
+    robot = SimulatedRobot()
+    results = {}
+    for name, setup in benchmarks.items():
+        if only and not any(word in name for word in only):
+            continue
+        results[name] = {"seconds": timeCall(setup(robot))}
+        robot.scheduler.cancelAll()
+    if not only or any(word in "autonomous routine" for word in only):
+        results["autonomous routine (per tick)"] = timeAutonomous(robot)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """:returns: names of the benchmarks which got slower than baseline * (1 + threshold)"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["seconds"], result["seconds"]
+        if after > before * (1.0 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks of the drive control hot path")
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--baseline", default=kBaselineFile, help="baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("only", nargs="*", help="only run benchmarks with these words in their name")
+    args = parser.parse_args()
+
+    try:
+        results = runAll(args.only)
+    finally:
+        clock.useFPGA()
+        resumeTiming()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    for name, result in results.items():
+        line = f"{name:32s} {result['seconds'] * 1e6:10.2f}us"
+        if name in baseline:
+            line += f"  (baseline {baseline[name]['seconds'] * 1e6:10.2f}us, {result['seconds'] / baseline[name]['seconds']:5.2f}x)"
+        print(line)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"saved to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"slower than baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
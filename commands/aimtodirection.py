@@ -9,9 +9,14 @@ import commands2
 import typing
 
 from subsystems.drivetrain import Drivetrain
-from wpimath.geometry import Rotation2d
+from utils.geometry import headingError, wrapDegrees
+from utils.log import getLogger
+from utils.tuning import tunable
 
+log = getLogger(__name__)
 
+
+@tunable
 class AimToDirectionConstants:
     kP = 0.002  # 0.002 is the default
     kMinTurnSpeed = 0.15  # turning slower than this is unproductive for the motor (might not even spin)
@@ -24,21 +29,19 @@ class AimToDirection(commands2.Command):
         self.targetDegrees = degrees
         self.speed = min((1.0, abs(speed)))
         self.fwdSpeed = min((1.0, abs(fwd_speed)))
-        self.targetDirection = None
+        self.targetDirection = None  # degrees
         self.drivetrain = drivetrain
         self.addRequirements(drivetrain)
 
     def initialize(self):
         if callable(self.targetDegrees):
-            self.targetDirection = Rotation2d.fromDegrees(self.targetDegrees())
+            self.targetDirection = wrapDegrees(self.targetDegrees())
         else:
-            self.targetDirection = Rotation2d.fromDegrees(self.targetDegrees)
+            self.targetDirection = wrapDegrees(self.targetDegrees)
 
     def execute(self):
         # 1. how many degrees are left to turn?
-        currentDirection = self.drivetrain.getHeading()
-        rotationRemaining = self.targetDirection - currentDirection
-        degreesRemaining = rotationRemaining.degrees()
+        degreesRemaining = headingError(self.targetDirection, self.drivetrain.getFrame().headingDegrees)
 
         # 2. proportional control: if we are almost finished turning, use slower turn speed (to avoid overshooting)
         turnSpeed = self.speed
@@ -51,10 +54,10 @@ class AimToDirection(commands2.Command):
         # 3. act on it! if target angle is on the right, turn right
         if degreesRemaining > 0:
             self.drivetrain.arcadeDrive(self.fwdSpeed, turnSpeed)
-            print(f"AimToDirection: {degreesRemaining} degrees remaining, {turnSpeed} turn speed")
+            log.debug("AimToDirection: %s degrees remaining, %s turn speed", degreesRemaining, turnSpeed)
         else:
             self.drivetrain.arcadeDrive(self.fwdSpeed, -turnSpeed)  # otherwise, turn left
-            print(f"AimToDirection: {degreesRemaining} degrees remaining, {-turnSpeed} turn speed")
+            log.debug("AimToDirection: %s degrees remaining, %s turn speed", degreesRemaining, -turnSpeed)
 
     def end(self, interrupted: bool):
         self.drivetrain.arcadeDrive(0, 0)
@@ -63,13 +66,12 @@ class AimToDirection(commands2.Command):
         if self.fwdSpeed != 0:
             return False   # if someone wants us to drive forward while aiming, then we are never finished
 
-        currentDirection = self.drivetrain.getHeading()
-        rotationRemaining = self.targetDirection - currentDirection
-        degreesRemaining = rotationRemaining.degrees()
+        frame = self.drivetrain.getFrame()
+        degreesRemaining = headingError(self.targetDirection, frame.headingDegrees)
         # if we are pretty close to the direction we wanted, consider the command finished
         if abs(degreesRemaining) < AimToDirectionConstants.kAngleToleranceDegrees:
-            turnVelocity = self.drivetrain.getGyroVelocityZ()
-            print(f"AimToDirection: possible stopping velocity {turnVelocity}")
+            turnVelocity = frame.gyroRateZ
+            log.debug("AimToDirection: possible stopping velocity %s", turnVelocity)
             if abs(turnVelocity) < AimToDirectionConstants.kAngleVelocityToleranceDegreesPerSec:
-                print(f"AimToDirection: finished with velocity {turnVelocity}")
+                log.info("AimToDirection: finished with velocity %s", turnVelocity)
                 return True
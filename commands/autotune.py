@@ -0,0 +1,257 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+import math
+
+import commands2
+
+from commands.aimtodirection import AimToDirectionConstants
+from commands.gotopoint import GoToPointConstants
+from subsystems.drivetrain import Drivetrain
+from utils.geometry import headingError
+from utils.log import getLogger
+from utils.tuning import applyTuning, defaultValue, saveTuning
+
+log = getLogger(__name__)
+
+
+class AutoTuneConstants:
+    kRampPerSecond = 0.2  # when looking for the minimum effort which moves the robot, increase it this fast
+    kMovingDegreesPerSec = 20  # turning faster than this = the robot is moving
+    kMovingInchPerSec = 1.5  # driving faster than this = the robot is moving
+    kRelayTurnEffort = 0.5
+    kRelayTranslateEffort = 0.5
+    kHysteresisDegrees = 1.0  # (so the relay doesn't flip back and forth on sensor noise)
+    kHysteresisInch = 0.05
+    kCycles = 4  # oscillation cycles to measure (after the first one, which is not regular yet)
+    kRelayTimeoutSeconds = 10.0  # if those cycles don't happen in this long, the robot is not oscillating: failed
+    kSettleSeconds = 0.5  # stand still for this long between the tests
+    kGainFromUltimateGain = 1 / 3.2  # Tyreus-Luyben rule (less overshoot than Ziegler-Nichols 0.5)
+    kMaxGainChange = 4.0  # don't trust results more than 4x away from the default (untuned) gains
+    kMaxMinSpeedChange = 2.0  # (and min speeds more than 2x away: these get loaded at every startup)
+
+
+class _RampTest:
+    """Increase the effort until the robot starts moving: that effort is the minimum productive effort"""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.start = None
+        self.effort = 0.0
+        self.result = None
+
+    def update(self, speed: float, now: float) -> float:
+        if self.start is None:
+            self.start = now
+        if abs(speed) > self.threshold:
+            self.result = self.effort
+        self.effort = min(1.0, AutoTuneConstants.kRampPerSecond * (now - self.start))
+        return self.effort
+
+    def failed(self) -> bool:
+        return self.result is None and self.effort >= 1.0
+
+    def done(self) -> bool:
+        return self.result is not None or self.failed()
+
+
+class _RelayTest:
+    """
+    Relay (bang-bang) feedback: full +effort when below the setpoint, full -effort when above.
+    The system then oscillates, and from the oscillation amplitude `a` we get the ultimate gain 4 * effort / (pi * a)
+    (the proportional gain at which a P controller would oscillate), and the ultimate period
+    """
+
+    def __init__(self, effort: float, hysteresis: float, cycles: int, timeout: float):
+        self.effort = effort
+        self.hysteresis = hysteresis
+        self.cycles = cycles
+        self.timeout = timeout
+        self.start = None
+        self.now = None
+        self.output = effort
+        self.risingEdges = []  # times when the output switched from - to +
+        self.amplitudes = []  # half of (max - min) during each cycle
+        self.maximum = -math.inf
+        self.minimum = math.inf
+
+    def update(self, error: float, now: float) -> float:
+        """:param error: setpoint minus measurement"""
+        if self.start is None:
+            self.start = now
+        self.now = now
+        self.maximum = max(self.maximum, -error)
+        self.minimum = min(self.minimum, -error)
+        if self.output < 0 and error > self.hysteresis:
+            self.output = self.effort
+            self.risingEdges.append(now)
+            if len(self.risingEdges) > 2:  # (the first cycle, up to the 2nd rising edge, is skipped)
+                self.amplitudes.append((self.maximum - self.minimum) / 2)
+            self.maximum, self.minimum = -math.inf, math.inf
+        elif self.output > 0 and error < -self.hysteresis:
+            self.output = -self.effort
+        return self.output
+
+    def failed(self) -> bool:
+        return len(self.amplitudes) < self.cycles and self.now - self.start > self.timeout
+
+    def done(self) -> bool:
+        return len(self.amplitudes) >= self.cycles or self.failed()
+
+    def ultimateGain(self) -> float:
+        amplitude = sum(self.amplitudes) / len(self.amplitudes)
+        return 4 * self.effort / (math.pi * max(amplitude, 1e-6))
+
+    def ultimatePeriod(self) -> float:
+        edges = self.risingEdges[1:]
+        return (edges[-1] - edges[0]) / (len(edges) - 1)
+
+
+class AutoTune(commands2.Command):
+    def __init__(self, drivetrain: Drivetrain, save: bool = True) -> None:
+        """Creates a new AutoTune command.
+        This command will measure how this robot responds (turning in place, then driving back and forth
+        about an inch), compute the gains for AimToDirection and GoToPoint, apply them and save them for this robot.
+        Needs about 30 inches of free space around the robot.
+
+        :param drivetrain:  The drivetrain subsystem on which this command will run
+        :param save:  save the results, so they are loaded at startup next time (see utils/tuning.py)
+        """
+        super().__init__()
+        self.drivetrain = drivetrain
+        self.save = save
+        self.steps = None
+        self.step = None
+        self.measured = {}
+        self.results = None
+        self.addRequirements(drivetrain)
+
+    def initialize(self) -> None:
+        # the tests, one after another (each is a function(frame, now) -> True when it is finished)
+        self.steps = [self._turnRamp, self._settle, self._turnRelay, self._settle,
+                      self._translateRamp, self._settle, self._translateRelay, self._settle]
+        self.measured = {}
+        self.results = None
+        # (the tests measure how the motors respond: without acceleration limits and sigma-delta modulation,
+        #  which would make a small effort move the robot, and the response look slower)
+        self.drivetrain.setRawMode(True)
+        self._nextStep(None)
+
+    def execute(self) -> None:
+        frame = self.drivetrain.getFrame()
+        if self.step is not None and self.step(frame, frame.timestamp):
+            self._nextStep(frame)
+
+    def end(self, interrupted: bool) -> None:
+        self.drivetrain.arcadeDrive(0, 0)
+        self.drivetrain.setRawMode(False)
+        if interrupted:
+            log.warning("AutoTune: interrupted, measured so far: %s", self.measured)
+
+    def isFinished(self) -> bool:
+        return self.step is None
+
+    def _nextStep(self, frame) -> None:
+        self.drivetrain.arcadeDrive(0, 0)
+        if not self.steps:
+            self.step = None
+            self._finish()
+            return
+        self.step = self.steps.pop(0)
+        self.stepStart = None
+        self.test = None
+        self.previous = frame
+
+    def _elapsed(self, now: float) -> float:
+        if self.stepStart is None:
+            self.stepStart = now
+        return now - self.stepStart
+
+    def _settle(self, frame, now) -> bool:
+        self.drivetrain.arcadeDrive(0, 0)
+        return self._elapsed(now) >= AutoTuneConstants.kSettleSeconds
+
+    def _turnRamp(self, frame, now) -> bool:
+        if self.test is None:
+            self.test = _RampTest(AutoTuneConstants.kMovingDegreesPerSec)
+        self.drivetrain.arcadeDrive(0, self.test.update(frame.gyroRateZ, now))
+        if self.test.done():
+            self.measured["minTurnEffort"] = self.test.result
+        return self.test.done()
+
+    def _turnRelay(self, frame, now) -> bool:
+        if self.test is None:
+            self.test = _RelayTest(AutoTuneConstants.kRelayTurnEffort, AutoTuneConstants.kHysteresisDegrees,
+                                   AutoTuneConstants.kCycles, AutoTuneConstants.kRelayTimeoutSeconds)
+            self.setpoint = frame.headingDegrees
+        self.drivetrain.arcadeDrive(0, self.test.update(headingError(self.setpoint, frame.headingDegrees), now))
+        if self.test.failed():
+            log.warning("AutoTune: turning did not oscillate in %.0f seconds, kP not tuned",
+                        AutoTuneConstants.kRelayTimeoutSeconds)
+        elif self.test.done():
+            self.measured["turnUltimateGain"] = self.test.ultimateGain()  # (effort per degree)
+            self.measured["turnUltimatePeriod"] = self.test.ultimatePeriod()
+        return self.test.done()
+
+    def _translateRamp(self, frame, now) -> bool:
+        if self.test is None:
+            self.test = _RampTest(AutoTuneConstants.kMovingInchPerSec)
+        previous, self.previous = self.previous, frame
+        speed = 0.0
+        if previous is not None and frame.timestamp > previous.timestamp:
+            speed = ((frame.leftDistance + frame.rightDistance) - (previous.leftDistance + previous.rightDistance)) \
+                    / 2 / (frame.timestamp - previous.timestamp)
+        self.drivetrain.arcadeDrive(self.test.update(speed, now), 0)
+        if self.test.done():
+            self.measured["minTranslateEffort"] = self.test.result
+        return self.test.done()
+
+    def _translateRelay(self, frame, now) -> bool:
+        distance = (frame.leftDistance + frame.rightDistance) / 2
+        if self.test is None:
+            self.test = _RelayTest(AutoTuneConstants.kRelayTranslateEffort, AutoTuneConstants.kHysteresisInch,
+                                   AutoTuneConstants.kCycles, AutoTuneConstants.kRelayTimeoutSeconds)
+            self.setpoint = distance
+        self.drivetrain.arcadeDrive(self.test.update(self.setpoint - distance, now), 0)
+        if self.test.failed():
+            log.warning("AutoTune: driving did not oscillate in %.0f seconds, kPTranslate not tuned",
+                        AutoTuneConstants.kRelayTimeoutSeconds)
+        elif self.test.done():
+            self.measured["translateUltimateGain"] = self.test.ultimateGain()  # (effort per inch)
+            self.measured["translateUltimatePeriod"] = self.test.ultimatePeriod()
+        return self.test.done()
+
+    def _finish(self) -> None:
+        measured = self.measured
+        results = {}
+        if measured.get("minTurnEffort") is not None:
+            results["AimToDirectionConstants.kMinTurnSpeed"] = _limitChange(
+                measured["minTurnEffort"],
+                defaultValue("AimToDirectionConstants.kMinTurnSpeed", AimToDirectionConstants.kMinTurnSpeed),
+                AutoTuneConstants.kMaxMinSpeedChange)
+        if measured.get("minTranslateEffort") is not None:
+            results["GoToPointConstants.kMinTranslateSpeed"] = _limitChange(
+                measured["minTranslateEffort"],
+                defaultValue("GoToPointConstants.kMinTranslateSpeed", GoToPointConstants.kMinTranslateSpeed),
+                AutoTuneConstants.kMaxMinSpeedChange)
+        if "turnUltimateGain" in measured:
+            results["AimToDirectionConstants.kP"] = _limitChange(
+                AutoTuneConstants.kGainFromUltimateGain * measured["turnUltimateGain"],
+                defaultValue("AimToDirectionConstants.kP", AimToDirectionConstants.kP))
+        if "translateUltimateGain" in measured:
+            results["GoToPointConstants.kPTranslate"] = _limitChange(
+                AutoTuneConstants.kGainFromUltimateGain * measured["translateUltimateGain"],
+                defaultValue("GoToPointConstants.kPTranslate", GoToPointConstants.kPTranslate))
+        self.results = results
+        log.info("AutoTune: measured %s, new constants %s", measured, results)
+        applyTuning(results)
+        if self.save and results:
+            path = saveTuning(results, measured)
+            log.info("AutoTune: saved to %s", path)
+
+
+def _limitChange(value: float, default: float, maxChange: float = AutoTuneConstants.kMaxGainChange) -> float:
+    return min(max(value, default / maxChange), default * maxChange)
@@ -8,14 +8,22 @@ import commands2
 
 from subsystems.drivetrain import Drivetrain
 
+
+class DriveDistanceConstants:
+    kPProfile = 0.05  # (profiled) extra effort per inch of being behind the profile
+    kFinishToleranceInch = 0.25  # (profiled) this close to the end of the profile is "close enough"
+    kExtraSeconds = 1.0  # (profiled) give up on getting closer, this long after the profile ended
+
+
 class DriveDistance(commands2.Command):
-    def __init__(self, speed: float, inches: float, drivetrain: Drivetrain) -> None:
+    def __init__(self, speed: float, inches: float, drivetrain: Drivetrain, profiled: bool = False) -> None:
         """Creates a new DriveDistance.
         This command will drive your robot for a desired distance at a desired speed.
 
         :param speed:  The speed at which the robot will drive, between 0.0 and 1.0
         :param inches: The number of inches the robot will drive
         :param drivetrain:  The drivetrain subsystem on which this command will run
+        :param profiled:  accelerate and slow down smoothly (trapezoidal profile) and stop exactly at the distance
         """
         super().__init__()
 
@@ -24,15 +32,37 @@ class DriveDistance(commands2.Command):
         self.drivetrain = drivetrain
         self.addRequirements(drivetrain)
         self.startPoint = None
+        self.profiled = profiled
+        self.profile = None
+        self.startTime = None
+        self.startDistance = None
+        self.profileError = 0.0
 
     def initialize(self) -> None:
         """Called when the command is initially scheduled."""
         self.drivetrain.arcadeDrive(0, 0)
-        self.startPoint = self.drivetrain.getLocation()
+        frame = self.drivetrain.getFrame()
+        self.startPoint = frame.location()
+        if self.profiled:
+            direction = 1 if self.speed >= 0 else -1
+            self.profile = self.drivetrain.makeProfile(direction * self.distanceToTravel, self.speed)
+            self.startTime = frame.timestamp
+            self.startDistance = 0.5 * (frame.leftDistance + frame.rightDistance)
+            self.profileError = self.profile.distance
 
     def execute(self) -> None:
         """Called every time the scheduler runs while the command is scheduled."""
-        self.drivetrain.arcadeDrive(self.speed, 0)
+        if self.profile is None:
+            self.drivetrain.arcadeDrive(self.speed, 0)
+            return
+
+        # where should we be now, and how fast should we be going, according to the profile?
+        frame = self.drivetrain.getFrame()
+        position, velocity, _ = self.profile.sample(frame.timestamp - self.startTime)
+        travelled = 0.5 * (frame.leftDistance + frame.rightDistance) - self.startDistance
+        self.profileError = position - travelled
+        effort = velocity / self.drivetrain.kMaxSpeedInchPerSecond + DriveDistanceConstants.kPProfile * self.profileError
+        self.drivetrain.arcadeDrive(effort, 0)
 
     def end(self, interrupted: bool) -> None:
         """Called once the command ends or is interrupted."""
@@ -40,7 +70,14 @@ class DriveDistance(commands2.Command):
 
     def isFinished(self) -> bool:
         """Returns true when the command should end."""
+        if self.profile is not None:
+            t = self.drivetrain.getFrame().timestamp - self.startTime
+            if self.profile.isFinished(t):
+                return abs(self.profileError) < DriveDistanceConstants.kFinishToleranceInch or \
+                       t > self.profile.duration + DriveDistanceConstants.kExtraSeconds
+            return False
+
         # Compare distance travelled from start to desired distance
-        currentPoint = self.drivetrain.getLocation()
+        currentPoint = self.drivetrain.getFrame().location()
         if currentPoint.distance(self.startPoint) >= self.distanceToTravel:
             return True
@@ -0,0 +1,76 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+import commands2
+
+from commands.rotateangle import RotateAngle
+from subsystems.drivetrain import Drivetrain
+from subsystems.linesensor import LineSensor
+
+
+class FollowLineConstants:
+    kP = 0.6  # turn speed per unit of line position (-1.0 to 1.0)
+    kD = 1.5  # plus this much per unit of line position change per tick (damps the wiggling)
+    kSlowDownInTurns = 0.6  # at line position 1.0, drive forward this much slower
+    kSearchSpeed = 0.5  # turning speed while looking for a lost line
+    kLostLineSeconds = 1.0  # if the line is not seen for this long, stop
+
+
+class FollowLine(commands2.Command):
+    def __init__(self, drivetrain: Drivetrain, lineSensor: LineSensor, speed: float = 0.6) -> None:
+        """Creates a new FollowLine command.
+        This command will follow a dark line on a light floor, and finish if it loses the line for a while.
+
+        :param drivetrain:  The drivetrain subsystem on which this command will run
+        :param lineSensor:  The (calibrated) line sensor, see CalibrateLineSensor
+        :param speed:  The forward speed on a straight line
+        """
+        super().__init__()
+        self.drivetrain = drivetrain
+        self.lineSensor = lineSensor
+        self.speed = speed
+        self.previousPosition = 0.0
+        self.lastSeen = None
+        self.addRequirements(drivetrain)
+
+    def initialize(self) -> None:
+        self.lineSensor.activate()
+        self.previousPosition = self.lineSensor.getLinePosition()
+        self.lastSeen = self.drivetrain.getFrame().timestamp
+
+    def execute(self) -> None:
+        position = self.lineSensor.getLinePosition()
+
+        # 1. if we don't see the line, turn in place towards the side where it was seen last
+        if not self.lineSensor.isLineVisible():
+            self.drivetrain.arcadeDrive(0.0, FollowLineConstants.kSearchSpeed * (1.0 if position >= 0 else -1.0))
+            self.previousPosition = position
+            return
+        self.lastSeen = self.drivetrain.getFrame().timestamp
+
+        # 2. otherwise turn towards the line (PD control), and slow down if it's far to the side
+        rotateSpeed = FollowLineConstants.kP * position + FollowLineConstants.kD * (position - self.previousPosition)
+        self.previousPosition = position
+        translateSpeed = self.speed * (1.0 - FollowLineConstants.kSlowDownInTurns * abs(position))
+        self.drivetrain.arcadeDrive(translateSpeed, min(max(rotateSpeed, -1.0), 1.0))
+
+    def end(self, interrupted: bool) -> None:
+        self.drivetrain.arcadeDrive(0, 0)
+        self.lineSensor.deactivate()
+
+    def isFinished(self) -> bool:
+        return self.drivetrain.getFrame().timestamp - self.lastSeen > FollowLineConstants.kLostLineSeconds
+
+
+def CalibrateLineSensor(lineSensor: LineSensor, drivetrain: Drivetrain, speed: float = 0.5) -> commands2.Command:
+    """
+    A command to calibrate the line sensor: start with the robot on the line, and it will turn
+    left 45 degrees, right 90 degrees and back, sweeping both sensors over the line and the floor
+    """
+    sweep = (RotateAngle(speed=speed, degrees=45, drivetrain=drivetrain)
+             .andThen(RotateAngle(speed=-speed, degrees=90, drivetrain=drivetrain))
+             .andThen(RotateAngle(speed=speed, degrees=45, drivetrain=drivetrain)))
+    return sweep.beforeStarting(lineSensor.startCalibration).finallyDo(lambda interrupted: lineSensor.stopCalibration())
@@ -0,0 +1,258 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+from __future__ import annotations
+import functools
+import math
+import typing
+from array import array
+
+import commands2
+
+from subsystems.drivetrain import Drivetrain
+from commands.aimtodirection import AimToDirectionConstants
+from commands.gotopoint import GoToPointConstants
+from utils.geometry import wrapDegrees
+
+
+class FollowRouteConstants:
+    kMaxAccelerationInchPerSec2 = 40.0  # faster than this and XRP wheels might skid
+    kMaxLateralAccelerationInchPerSec2 = 30.0  # how fast we can go through the corners
+    kCornerRadiusInch = 5.0  # corners of the route get rounded with this radius (less, if the legs are short)
+    kLookaheadInch = 4.0  # steer towards the point of the route which is this far ahead
+    kPathSpacingInch = 0.25  # distance between the precomputed points of the route
+    kFinishToleranceInch = 1.0  # this close to the last point is "close enough"
+    kRotateInPlaceDegrees = 60  # if the route is further than this from our heading, turn in place first
+    kStopTurnDegrees = 135  # corners sharper than this (like turning back) are not rounded: stop there and turn
+
+
+class Route:
+    """A smooth route, sampled every kPathSpacingInch, with the speed (inch/sec) and time at each point"""
+    __slots__ = ("x", "y", "speed", "time", "legEnd", "stops")
+
+    def __init__(self):
+        self.x = array("d")
+        self.y = array("d")
+        self.speed = array("d")
+        self.time = array("d")
+        self.legEnd = array("l")  # index of the point where each waypoint (after the first one) got passed
+        self.stops = array("l")  # indices of the points where the robot stops to turn in place (sharp corners)
+
+    def __len__(self):
+        return len(self.x)
+
+    def duration(self) -> float:
+        return self.time[-1] if len(self.time) else 0.0
+
+
+@functools.lru_cache(maxsize=32)
+def planRoute(waypoints: tuple, maxSpeed: float, maxAcceleration: float,
+              maxLateralAcceleration: float = FollowRouteConstants.kMaxLateralAccelerationInchPerSec2,
+              cornerRadius: float = FollowRouteConstants.kCornerRadiusInch,
+              spacing: float = FollowRouteConstants.kPathSpacingInch) -> Route:
+    """
+    Round the corners of the waypoint polyline and compute the fastest speed at every point of it
+    (the result is cached: the same waypoints and limits are planned only once)
+
+    :param waypoints: tuple of (x, y) points in inches, the first one is where the route starts
+    :param maxSpeed: inches per second
+    :param maxAcceleration: inches per second squared
+    """
+    route = Route()
+    curvature = array("d")
+
+    def addLine(x0, y0, x1, y1):
+        length = math.hypot(x1 - x0, y1 - y0)
+        steps = max(1, int(math.ceil(length / spacing)))
+        for step in range(1, steps + 1):
+            route.x.append(x0 + (x1 - x0) * step / steps)
+            route.y.append(y0 + (y1 - y0) * step / steps)
+            curvature.append(0.0)
+
+    def addArc(cx, cy, radius, startAngle, sweep):
+        steps = max(1, int(math.ceil(abs(sweep) * radius / spacing)))
+        for step in range(1, steps + 1):
+            angle = startAngle + sweep * step / steps
+            route.x.append(cx + radius * math.cos(angle))
+            route.y.append(cy + radius * math.sin(angle))
+            curvature.append(1.0 / radius)
+
+    # 1. repeated waypoints are the same corner (but they still get their own entry in legEnd, see the end)
+    points = [waypoints[0]]
+    pointOf = []  # for each waypoint after the first one: which of the points it is
+    for waypoint in waypoints[1:]:
+        if waypoint != points[-1]:
+            points.append(waypoint)
+        pointOf.append(len(points) - 1)
+
+    # 2. straight legs, with circular arcs instead of sharp corners
+    x, y = points[0]
+    route.x.append(x)
+    route.y.append(y)
+    curvature.append(0.0)
+    pointEnd = array("l", [0])  # index of the route point where each of the points got passed
+    for (ax, ay), (px, py), (bx, by) in zip(points, points[1:], points[2:]):
+        inLength, outLength = math.hypot(px - ax, py - ay), math.hypot(bx - px, by - py)
+        ux1, uy1 = (px - ax) / inLength, (py - ay) / inLength
+        ux2, uy2 = (bx - px) / outLength, (by - py) / outLength
+        turn = math.atan2(ux1 * uy2 - uy1 * ux2, ux1 * ux2 + uy1 * uy2)  # positive = left turn
+        if abs(turn) < 1e-6 or abs(turn) > math.radians(FollowRouteConstants.kStopTurnDegrees):
+            # (no corner to round, or too sharp to round it: drive all the way to the waypoint)
+            addLine(x, y, px, py)
+            x, y = px, py
+            if abs(turn) >= 1e-6:
+                route.stops.append(len(route.x) - 1)
+            pointEnd.append(len(route.x) - 1)
+            continue
+        tangent = min(cornerRadius * math.tan(abs(turn) / 2), 0.5 * inLength, 0.5 * outLength)
+        radius = tangent / math.tan(abs(turn) / 2)
+        addLine(x, y, px - ux1 * tangent, py - uy1 * tangent)
+        x, y = px - ux1 * tangent, py - uy1 * tangent
+        side = 1.0 if turn > 0 else -1.0
+        cx, cy = x - side * uy1 * radius, y + side * ux1 * radius
+        addArc(cx, cy, radius, math.atan2(y - cy, x - cx), turn)
+        x, y = route.x[-1], route.y[-1]
+        pointEnd.append(len(route.x) - 1)
+    addLine(x, y, *points[-1])
+    pointEnd.append(len(route.x) - 1)
+    for point in pointOf:
+        route.legEnd.append(pointEnd[point])
+
+    # 3. speed limits: in the corners and sharp corners, accelerating from zero and decelerating to zero at the end
+    n = len(route.x)
+    speed = route.speed
+    for k in curvature:
+        speed.append(min(maxSpeed, math.sqrt(maxLateralAcceleration / k)) if k > 0 else maxSpeed)
+    speed[0] = 0.0
+    speed[n - 1] = 0.0
+    for stop in route.stops:
+        speed[stop] = 0.0
+    distances = [math.hypot(route.x[i] - route.x[i - 1], route.y[i] - route.y[i - 1]) for i in range(1, n)]
+    for i in range(1, n):
+        speed[i] = min(speed[i], math.sqrt(speed[i - 1] ** 2 + 2 * maxAcceleration * distances[i - 1]))
+    for i in range(n - 2, -1, -1):
+        speed[i] = min(speed[i], math.sqrt(speed[i + 1] ** 2 + 2 * maxAcceleration * distances[i]))
+
+    # 4. time at each point
+    t = 0.0
+    route.time.append(t)
+    for i in range(1, n):
+        average = 0.5 * (speed[i - 1] + speed[i])
+        t += distances[i - 1] / average if average > 0 else 0.0
+        route.time.append(t)
+    return route
+
+
+class FollowRoute(commands2.Command):
+    def __init__(self, waypoints: typing.Sequence[typing.Tuple[float, float]], drivetrain: Drivetrain,
+                 speed: float = 1.0, onWaypoint: typing.Callable[[int], None] = None) -> None:
+        """Creates a new FollowRoute command.
+        This command will drive through all the waypoints without stopping at the corners (corners get rounded).
+
+        :param waypoints: list of (x, y) points in inches, the first one is where the route starts
+        :param drivetrain: The drivetrain subsystem on which this command will run
+        :param speed: max speed, between 0.0 and 1.0
+        :param onWaypoint: function(waypoint number) called when each waypoint in the middle of the route
+          gets passed (for example, Stopwatch.split), the first waypoint is number 0
+        """
+        super().__init__()
+        assert len(waypoints) >= 2, "a route needs at least two waypoints"
+        self.waypoints = tuple((float(x), float(y)) for x, y in waypoints)
+        self.speed = min(1.0, abs(speed))
+        self.drivetrain = drivetrain
+        self.onWaypoint = onWaypoint
+        self.addRequirements(drivetrain)
+        self.route = None
+        self.index = 0
+        self.nextLeg = 0
+        self.nextStop = 0
+        self.turningInPlace = False
+
+    def initialize(self) -> None:
+        """Called when the command is initially scheduled."""
+        maxSpeed = self.speed * Drivetrain.kMaxSpeedInchPerSecond
+        maxAcceleration = min(FollowRouteConstants.kMaxAccelerationInchPerSec2,
+                              self.drivetrain.getMaxAccelerationInchPerSecSquared())
+        self.route = planRoute(self.waypoints, maxSpeed, maxAcceleration)
+        self.index = 0
+        self.nextLeg = 0
+        self.nextStop = 0
+        self.turningInPlace = True
+
+    def execute(self) -> None:
+        """Called every time the scheduler runs while the command is scheduled."""
+        frame = self.drivetrain.getFrame()
+        route = self.route
+
+        # 1. which point of the route are we at, and which point is one lookahead distance ahead?
+        self.index = self._closestIndex(frame.x, frame.y)
+        if self.onWaypoint is not None:
+            self._checkWaypoints()
+        if self.nextStop < len(route.stops) and self.index >= route.stops[self.nextStop]:
+            self.nextStop += 1
+            self.turningInPlace = True  # (arrived at a sharp corner: turn there, before driving on)
+        last = len(route) - 1
+        ahead = min(last, self.index + int(FollowRouteConstants.kLookaheadInch / FollowRouteConstants.kPathSpacingInch))
+        if self.nextStop < len(route.stops):
+            ahead = min(ahead, route.stops[self.nextStop])  # (don't look around a sharp corner before stopping there)
+        dx, dy = route.x[ahead] - frame.x, route.y[ahead] - frame.y
+        lookahead = math.hypot(dx, dy)
+        degreesRemaining = wrapDegrees(math.degrees(math.atan2(dy, dx)) - frame.headingDegrees)
+
+        # 2. if the route goes in a very different direction, turn in place first (only at the start and at stops)
+        if self.turningInPlace and abs(degreesRemaining) > FollowRouteConstants.kRotateInPlaceDegrees:
+            turnSpeed = min(self.speed, AimToDirectionConstants.kP * abs(degreesRemaining))
+            turnSpeed = max(turnSpeed, AimToDirectionConstants.kMinTurnSpeed)
+            self.drivetrain.arcadeDrive(0.0, math.copysign(turnSpeed, degreesRemaining))
+            return
+        self.turningInPlace = False
+
+        # 3. otherwise drive at the planned speed, along the arc which passes through the lookahead point
+        fwd = max(route.speed[self.index] / Drivetrain.kMaxSpeedInchPerSecond, GoToPointConstants.kMinTranslateSpeed)
+        curvature = 2.0 * math.sin(math.radians(degreesRemaining)) / lookahead if lookahead > 0 else 0.0
+        if abs(degreesRemaining) > 90 and lookahead > 0:
+            # (the lookahead point is behind us, after a wide miss: sin() would steer less and less, turn hardest)
+            curvature = math.copysign(2.0 / lookahead, degreesRemaining)
+        rot = fwd * curvature * Drivetrain.kTrackWidthInch / 2
+        self.drivetrain.arcadeDrive(fwd, rot)
+
+    def end(self, interrupted: bool) -> None:
+        """Called once the command ends or is interrupted."""
+        self.drivetrain.arcadeDrive(0, 0)
+
+    def isFinished(self) -> bool:
+        """Returns true when the command should end."""
+        route = self.route
+        last = len(route) - 1
+        if self.index >= last:
+            return True  # the nearest point of the route is its end: we arrived (or overshot)
+        if len(route.legEnd) > 1 and self.index < route.legEnd[-2]:
+            return False  # not on the last leg yet (a route can end where it started)
+        frame = self.drivetrain.getFrame()
+        return math.hypot(route.x[last] - frame.x, route.y[last] - frame.y) < FollowRouteConstants.kFinishToleranceInch
+
+    def _checkWaypoints(self) -> None:
+        # (the last waypoint is not reported here: arriving there is the end of the command)
+        legEnd = self.route.legEnd
+        while self.nextLeg < len(legEnd) - 1 and self.index >= legEnd[self.nextLeg]:
+            self.nextLeg += 1
+            self.onWaypoint(self.nextLeg)
+
+    def _closestIndex(self, x: float, y: float) -> int:
+        # only search forward from where we were, so that the route crossing itself does not confuse us
+        # (and not past the next stop, where the route may come back along itself)
+        route = self.route
+        window = int(4 * FollowRouteConstants.kLookaheadInch / FollowRouteConstants.kPathSpacingInch)
+        end = min(len(route), self.index + window)
+        if self.nextStop < len(route.stops):
+            end = min(end, route.stops[self.nextStop] + 1)
+        best, bestDistance = self.index, math.inf
+        for i in range(self.index, end):
+            distance = (route.x[i] - x) ** 2 + (route.y[i] - y) ** 2
+            if distance < bestDistance:
+                best, bestDistance = i, distance
+        return best
+
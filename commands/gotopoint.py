@@ -6,45 +6,66 @@
 
 from __future__ import annotations
 import commands2
+import math
 import typing
 
 from subsystems.drivetrain import Drivetrain
 from commands.aimtodirection import AimToDirectionConstants
-from wpimath.geometry import Rotation2d, Translation2d
-from wpilib import SmartDashboard
+from wpimath.geometry import Translation2d
+from utils.geometry import directionTo, distance, headingError
+from utils.log import getLogger
+from utils.telemetry import telemetry
+from utils.tuning import tunable
 
+log = getLogger(__name__)
 
+
+@tunable
 class GoToPointConstants:
     kPTranslate = 0.04
     kMinTranslateSpeed = 0.3  # moving forward slower than this is unproductive
     kOversteerAdjustment = 0.5
+    kObstacleLookaheadInch = 12  # (if there is an occupancy grid) look for obstacles this far ahead on the way
+    kObstacleStopInch = 5  # and stop this far from them
+    kPObstacle = 0.05  # slowing down before that
 
 class GoToPoint(commands2.Command):
-    def __init__(self, x, y, drivetrain, speed=1.0, slowDownAtFinish=True) -> None:
+    def __init__(self, x, y, drivetrain, speed=1.0, slowDownAtFinish=True, grid=None) -> None:
+        """
+        :param grid: (optional) an OccupancyGrid, to slow down and stop in front of the obstacles it knows about
+          (the grid maps the obstacles while this command runs, and if one blocks the way, the command finishes)
+        """
         self.targetPosition = Translation2d(x, y)
+        self.targetX, self.targetY = float(x), float(y)  # (the control math below uses plain floats, it's faster)
         self.speed = speed
         self.stop = slowDownAtFinish
-        self.initialDirection = None
+        self.initialX = self.initialY = None
+        self.initialDirection = None  # degrees
         self.initialDistance = None
         self.pointingInGoodDirection = False
+        self.blocked = False  # (an obstacle on the way stopped us)
         self.drivetrain = drivetrain
+        self.grid = grid
         self.addRequirements(drivetrain)
+        self.telemetryTargetHeading = telemetry.number("z-heading-target", period=0.05, deadband=0.1)
+        self.telemetryDistanceToTarget = telemetry.number("distance-to-target")
 
     def initialize(self):
-        self.initialPosition = self.drivetrain.getPose().translation()
-        initialDirection = self.targetPosition - self.initialPosition
-        self.initialDirection = Rotation2d(initialDirection.x, initialDirection.y)
-        self.initialDistance = self.initialPosition.distance(self.targetPosition)
+        frame = self.drivetrain.getFrame()
+        self.initialX, self.initialY = frame.x, frame.y
+        self.initialDirection = directionTo(frame.x, frame.y, self.targetX, self.targetY)
+        self.initialDistance = distance(frame.x, frame.y, self.targetX, self.targetY)
         self.pointingInGoodDirection = False
+        self.blocked = False
+        if self.grid is not None:
+            self.grid.activate()
 
     def execute(self):
         # 1. to which direction we should be pointing?
-        currentPose = self.drivetrain.getPose()
-        currentDirection = currentPose.rotation()
-        currentPoint = currentPose.translation()
-        targetDirectionVector = self.targetPosition - currentPoint
-        targetDirection = Rotation2d(targetDirectionVector.x, targetDirectionVector.y)
-        degreesRemaining = (targetDirection - currentDirection).degrees()
+        frame = self.drivetrain.getFrame()
+        x, y, currentDirection = frame.x, frame.y, frame.headingDegrees
+        targetDirection = directionTo(x, y, self.targetX, self.targetY)
+        degreesRemaining = headingError(targetDirection, currentDirection)
 
         # 2. if we are pointing in a very wrong direction (more than 45 degrees away), rotate away without moving
         if degreesRemaining > 45 and not self.pointingInGoodDirection:
@@ -58,14 +79,14 @@ class GoToPoint(commands2.Command):
 
         # 3. otherwise, drive forward but with an oversteer adjustment
         if GoToPointConstants.kOversteerAdjustment != 0:
-            deviationFromInitial = (targetDirection - self.initialDirection).degrees()
+            deviationFromInitial = headingError(targetDirection, self.initialDirection)
             adjustment = GoToPointConstants.kOversteerAdjustment * deviationFromInitial
             if adjustment > 20: adjustment = 20  # avoid oscillations by capping the adjustment at 20 degrees
             if adjustment < -20: adjustment = -20  # avoid oscillations by capping the adjustment at 20 degrees
-            targetDirection = targetDirection.rotateBy(Rotation2d.fromDegrees(adjustment))
-            degreesRemaining = (targetDirection - currentDirection).degrees()
+            targetDirection = headingError(targetDirection + adjustment, 0.0)
+            degreesRemaining = headingError(targetDirection, currentDirection)
 
-        SmartDashboard.putNumber("z-heading-target", targetDirection.degrees())
+        self.telemetryTargetHeading.set(targetDirection)
 
         # 3. now when we know the desired direction, we can compute the turn speed
         rotateSpeed = abs(self.speed)
@@ -74,13 +95,15 @@ class GoToPoint(commands2.Command):
             rotateSpeed = proportionalRotateSpeed
 
         # 5. but if not too different, then we can drive while turning
-        distanceRemaining = self.targetPosition.distance(currentPoint)
+        distanceRemaining = distance(x, y, self.targetX, self.targetY)
         proportionalTransSpeed = GoToPointConstants.kPTranslate * distanceRemaining
         translateSpeed = self.speed  # if we don't plan to stop at the end, go at max speed
         if translateSpeed > proportionalTransSpeed and self.stop:
             translateSpeed = proportionalTransSpeed
         if translateSpeed < GoToPointConstants.kMinTranslateSpeed:
             translateSpeed = GoToPointConstants.kMinTranslateSpeed
+        if self.grid is not None:
+            translateSpeed = self.limitSpeedNearObstacles(x, y, distanceRemaining, translateSpeed)
 
         # 6. if we need to be turning left while driving, use negative rotation speed
         if degreesRemaining < 0:
@@ -88,21 +111,47 @@ class GoToPoint(commands2.Command):
         else:  # otherwise, use positive
             self.drivetrain.arcadeDrive(translateSpeed, rotateSpeed)
 
+    def limitSpeedNearObstacles(self, x0, y0, distanceRemaining, translateSpeed):
+        # how far can we go towards the target before something known is in the way? (obstacles behind us
+        # or to the side don't count: only those which we would hit on the way)
+        lookahead = min(distanceRemaining, GoToPointConstants.kObstacleLookaheadInch)
+        if lookahead <= 0:
+            return translateSpeed
+        scale = lookahead / distanceRemaining
+        x1, y1 = x0 + (self.targetX - x0) * scale, y0 + (self.targetY - y0) * scale
+        clearance = self.grid.clearanceAlong(x0, y0, x1, y1)
+        if clearance == math.inf:
+            return translateSpeed
+
+        # if something is, slow down in proportion to the distance to it (and if too close, give up: see isFinished)
+        limit = GoToPointConstants.kPObstacle * (clearance - GoToPointConstants.kObstacleStopInch)
+        if limit <= 0:
+            if not self.blocked:
+                log.warning("GoToPoint: obstacle %.1f inches ahead on the way to (%.1f, %.1f), stopped at (%.1f, %.1f)",
+                            clearance, self.targetX, self.targetY, x0, y0)
+            self.blocked = True
+            return 0.0
+        return min(translateSpeed, limit)
+
     def end(self, interrupted: bool):
         self.drivetrain.arcadeDrive(0, 0)
+        if self.grid is not None:
+            self.grid.deactivate()
 
     def isFinished(self) -> bool:
+        if self.blocked:
+            return True  # (an obstacle is in the way, we will not get there)
+
         # 1. did we reach the point where we must move very slow?
-        currentPose = self.drivetrain.getPose()
-        currentPosition = currentPose.translation()
-        distanceRemaining = self.targetPosition.distance(currentPosition)
+        frame = self.drivetrain.getFrame()
+        distanceRemaining = distance(frame.x, frame.y, self.targetX, self.targetY)
         translateSpeed = GoToPointConstants.kPTranslate * distanceRemaining
 
         # 1. have we reached the point where we are moving very slowly?
         tooSlowNow = translateSpeed < 0.125 * GoToPointConstants.kMinTranslateSpeed and self.stop
 
         # 2. did we overshoot?
-        distanceFromInitialPosition = self.initialPosition.distance(currentPosition)
+        distanceFromInitialPosition = distance(self.initialX, self.initialY, frame.x, frame.y)
         if distanceFromInitialPosition >= self.initialDistance or tooSlowNow:
-            SmartDashboard.putNumber("distance-to-target", self.targetPosition.distance(currentPosition))
+            self.telemetryDistanceToTarget.set(distanceRemaining)
             return True  # we overshot
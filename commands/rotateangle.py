@@ -31,7 +31,7 @@ class RotateAngle(commands2.Command):
     def initialize(self) -> None:
         """Called when the command is initially scheduled."""
         self.drivetrain.arcadeDrive(0, 0)
-        self.startHeading = self.drivetrain.getHeading()
+        self.startHeading = self.drivetrain.getFrame().heading()
 
     def execute(self) -> None:
         """Called every time the scheduler runs while the command is scheduled."""
@@ -44,6 +44,6 @@ class RotateAngle(commands2.Command):
     def isFinished(self) -> bool:
         """Returns true when the command should end."""
         # Compare distance travelled from start to desired distance
-        currentHeading = self.drivetrain.getHeading()
+        currentHeading = self.drivetrain.getFrame().heading()
         if abs((currentHeading - self.startHeading).degrees()) >= self.degreesToTurn:
             return True
@@ -0,0 +1,42 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+# Simulating the robot without a physical XRP
+# -------------------------------------------
+#
+# `robotpy sim` loads this file automatically. With a real XRP (the --xrp option) the sensor values
+# come from the robot, so the model below is only used when you ask for it:
+#
+#    # Linux/macOS
+#    XRP_PLANT=1 python -m robotpy sim
+#
+# (and to run the autonomous routine faster than real time, without the GUI: python -m sim.headless)
+#
+
+import os
+import typing
+
+from wpimath.geometry import Pose2d, Rotation2d
+
+from sim.xrpplant import XRPPlant, kMetersPerInch
+
+if typing.TYPE_CHECKING:
+    from pyfrc.physics.core import PhysicsInterface
+    from robot import MyRobot
+
+
+class PhysicsEngine:
+    def __init__(self, physics_controller: "PhysicsInterface", robot: "MyRobot"):
+        self.physics_controller = physics_controller
+        self.plant = XRPPlant() if os.environ.get("XRP_PLANT", "0") == "1" else None
+
+    def update_sim(self, now: float, tm_diff: float) -> None:
+        if self.plant is None:
+            return
+        self.plant.update(tm_diff)
+        x, y, heading = self.plant.getPose()
+        self.physics_controller.field.setRobotPose(
+            Pose2d(x * kMetersPerInch, y * kMetersPerInch, Rotation2d.fromDegrees(heading)))
@@ -23,15 +23,29 @@
 import os
 import typing
 
-import wpilib
 import commands2
 
-from robotcontainer import RobotContainer
+from utils.clock import clock
+from utils.profiler import profiler
+from utils.startuptiming import startupTiming
+from utils.telemetry import telemetry
 
 # If your XRP isn't at the default address, set that here
 os.environ["HALSIMXRP_HOST"] = "192.168.42.1"
 os.environ["HALSIMXRP_PORT"] = "3540"
 
+# If you have more than one XRP, give each one a name here, so each gets its own tuning results (see utils/tuning.py)
+# (or run with environment variable XRP_ROBOT_NAME=<name>; without a name, the results are saved per XRP address)
+os.environ.setdefault("XRP_ROBOT_NAME", "")
+
+# To see how much of the 20ms loop each subsystem and command takes, set this to True
+# (or run with environment variable XRP_LOOP_TIMING=1)
+ENABLE_LOOP_TIMING = os.environ.get("XRP_LOOP_TIMING", "0") == "1"
+
+# To record every tick of sensor values and motor commands into logs/ (for analysis and replay), set this to True
+# (or run with environment variable XRP_FLIGHT_RECORDER=1)
+ENABLE_FLIGHT_RECORDER = os.environ.get("XRP_FLIGHT_RECORDER", "0") == "1"
+
 
 class MyRobot(commands2.TimedCommandRobot):
     """
@@ -40,6 +54,8 @@ class MyRobot(commands2.TimedCommandRobot):
     """
 
     autonomousCommand: typing.Optional[commands2.Command] = None
+    loopTiming: typing.Optional["LoopTiming"] = None
+    flightRecorder: typing.Optional["FlightRecorder"] = None
 
     def robotInit(self) -> None:
         """
@@ -47,12 +63,48 @@ class MyRobot(commands2.TimedCommandRobot):
         initialization code.
         """
 
+        # (imported here and not at the top, so the startup timing report can show what each import costs)
+        with startupTiming.phase("import robotcontainer"), startupTiming.trackImports():
+            from robotcontainer import RobotContainer
+
+        # If this robot was tuned (see commands/autotune.py), use its tuned constants
+        with startupTiming.phase("applyTuning()"):
+            from utils.tuning import applyTuning, loadTuning
+            applyTuning(loadTuning())
+
         # Instantiate our RobotContainer.  This will perform all our button bindings, and put our
         # autonomous chooser on the dashboard.
-        self.container = RobotContainer()
+        with startupTiming.phase("RobotContainer()"), startupTiming.trackImports():
+            self.container = RobotContainer()
+
+        if ENABLE_LOOP_TIMING:
+            from utils.looptiming import LoopTiming
+            self.loopTiming = LoopTiming(self.getPeriod())
+            self.container.instrumentLoopTiming(self.loopTiming)
+
+        if ENABLE_FLIGHT_RECORDER:
+            from utils.flightrecorder import FlightRecorder
+            self.flightRecorder = FlightRecorder(self.container.drivetrain)
+
+        startupTiming.report()
+
+    def robotPeriodic(self) -> None:
+        """This function is called every tick, in every mode: runs the scheduler and then publishes telemetry"""
+        clock.tick()  # (everybody calling clock.now() in this tick will get this same time)
+        if self.loopTiming:
+            self.loopTiming.startLoop()
+        super().robotPeriodic()
+        if self.flightRecorder:
+            self.flightRecorder.record()
+        telemetry.flush()
+        if self.loopTiming:
+            self.loopTiming.endLoop()
+        profiler.poll()  # (start or stop the profiler, if the "profiler" boolean on the dashboard was flipped)
 
     def disabledInit(self) -> None:
         """This function is called once each time the robot enters Disabled mode."""
+        if self.loopTiming:
+            self.loopTiming.dump()
 
     def disabledPeriodic(self) -> None:
         """This function is called periodically when disabled"""
@@ -17,10 +17,14 @@ from commands.rotateangle import RotateAngle
 
 from subsystems.drivetrain import Drivetrain
 from subsystems.arm import Arm
+from subsystems.occupancygrid import OccupancyGrid
+from subsystems.linesensor import LineSensor
 from subsystems.stopwatch import Stopwatch
 
-from commands.aimtodirection import AimToDirection
-from commands.gotopoint import GoToPoint
+from utils.profiler import profiler
+from utils.startuptiming import startupTiming
+
+# (AimToDirection, GoToPoint and FollowRoute are imported where they are used, to make the robot start faster)
 
 class RobotContainer:
     """
@@ -32,8 +36,13 @@ class RobotContainer:
 
     def __init__(self):
         # The robot's subsystems are defined here
-        self.drivetrain = Drivetrain()
-        self.arm = Arm()
+        with startupTiming.phase("Drivetrain()"):
+            self.drivetrain = Drivetrain()  # (Drivetrain(odometryRateHz=200) would update the pose 200 times/second)
+        with startupTiming.phase("Arm()"):
+            self.arm = Arm()
+        self.lineSensor = LineSensor(self.drivetrain)
+        # (GoToPoint(..., grid=self.occupancyGrid) avoids crashes, the grid maps obstacles only while such commands run)
+        self.occupancyGrid = OccupancyGrid(self.drivetrain)
 
         self.stopwatch = Stopwatch("race-time")
 
@@ -41,18 +50,38 @@ class RobotContainer:
         self.j0 = CommandXboxController(0)
         # (you can also use CommandPS4Controller or CommandJoystick, if you prefer those)
 
-        self.configureButtonBindings()
+        with startupTiming.phase("configureButtonBindings()"):
+            self.configureButtonBindings()
+
+    def lazy(self, makeCommand: typing.Callable[[], commands2.Command]) -> commands2.Command:
+        """
+        A command which makes the real command when the button is pressed for the first time (and then keeps it),
+        so the robot doesn't have to build all the button commands at startup
+
+        :param makeCommand: function that makes the real command, for example `lambda: DriveDistance(...)`
+        """
+        made = []
+
+        def schedule():
+            if not made:
+                made.append(makeCommand())
+            made[0].schedule()
+
+        return InstantCommand(schedule)
 
     def configureButtonBindings(self):
         """Use this method to define your button->command mappings"""
 
+        # (every button command below is wrapped in self.lazy(lambda: ...), which makes it only
+        #  when the button is pressed for the first time: this way the robot starts faster)
+
         # 1. Here is a command to drive forward 10 inches with speed 0.9
-        forward10inches = DriveDistance(speed=0.9, inches=10, drivetrain=self.drivetrain)
+        forward10inches = self.lazy(lambda: DriveDistance(speed=0.9, inches=10, drivetrain=self.drivetrain))
         # let's bind this command to button "y" on the joystick
         self.j0.y().onTrue(forward10inches)
 
         # and here is a command to drive back 10 inches
-        back10inches = DriveDistance(speed=-0.7, inches=10, drivetrain=self.drivetrain)
+        back10inches = self.lazy(lambda: DriveDistance(speed=-0.7, inches=10, drivetrain=self.drivetrain))
 
         #  - exercise 1: can you hook this command to button "a" on the joystick?
 
@@ -75,8 +104,8 @@ class RobotContainer:
 
 
         # 4. A command to turn right 45 degrees *but* we can add a 5 second timeout to it
-        right45degrees = RotateAngle(speed=0.6, degrees=+45, drivetrain=self.drivetrain)
-        right45degrees_timeout5s = right45degrees.withTimeout(5)
+        right45degrees_timeout5s = self.lazy(
+            lambda: RotateAngle(speed=0.6, degrees=+45, drivetrain=self.drivetrain).withTimeout(5))
         self.j0.rightBumper().onTrue(right45degrees_timeout5s)
 
         # exercise 4: can you make a command to turn the robot left by 45 degrees and with 3 second timeout?
@@ -85,20 +114,47 @@ class RobotContainer:
 
 
         # 5. Connecting commands together: making a half square
-        forward8inches1 = DriveDistance(speed=0.7, inches=8, drivetrain=self.drivetrain)
-        right90degrees1 = RotateAngle(speed=0.5, degrees=90, drivetrain=self.drivetrain)
-        forward8inches2 = DriveDistance(speed=0.7, inches=8, drivetrain=self.drivetrain)
-        right90degrees2 = RotateAngle(speed=0.5, degrees=90, drivetrain=self.drivetrain)
-        half_square = forward8inches1.andThen(right90degrees1).andThen(forward8inches2).andThen(right90degrees2)
+        def makeHalfSquare():
+            forward8inches1 = DriveDistance(speed=0.7, inches=8, drivetrain=self.drivetrain)
+            right90degrees1 = RotateAngle(speed=0.5, degrees=90, drivetrain=self.drivetrain)
+            forward8inches2 = DriveDistance(speed=0.7, inches=8, drivetrain=self.drivetrain)
+            right90degrees2 = RotateAngle(speed=0.5, degrees=90, drivetrain=self.drivetrain)
+            return forward8inches1.andThen(right90degrees1).andThen(forward8inches2).andThen(right90degrees2)
+
+        half_square = self.lazy(makeHalfSquare)
         self.j0.povDown().onTrue(half_square)
 
         # exercise 5: can you actually change the code above to make it a full square?
 
 
         # 6. A little helper instant command to reset the robot coordinates in SmartDashboard
-        reset_coordinates = commands2.InstantCommand(lambda: self.drivetrain.resetOdometry())
+        reset_coordinates = commands2.InstantCommand(lambda: self.resetOdometry())
         self.j0.povUp().onTrue(reset_coordinates)
 
+        # 6b. Line following: put the robot on the line and press "start" to calibrate the line sensor,
+        # then press "back" to follow the line (it stops when it loses the line for a second)
+        def makeCalibrateLineSensor():
+            from commands.followline import CalibrateLineSensor
+            return CalibrateLineSensor(self.lineSensor, self.drivetrain)
+
+        def makeFollowLine():
+            from commands.followline import FollowLine
+            return FollowLine(self.drivetrain, self.lineSensor, speed=0.6)
+
+        self.j0.start().onTrue(self.lazy(makeCalibrateLineSensor))
+        self.j0.back().onTrue(self.lazy(makeFollowLine))
+
+        # 6c. Measure this robot and tune the AimToDirection and GoToPoint constants for it (needs some free space)
+        def makeAutoTune():
+            from commands.autotune import AutoTune
+            return AutoTune(self.drivetrain)
+
+        self.j0.povRight().onTrue(self.lazy(makeAutoTune))
+
+        # 6d. Is the loop getting slow? Click the left stick to start the profiler, and click it again to stop it
+        # and write logs/profile-*.folded (the "profiler" boolean on the dashboard does the same, see utils/profiler.py)
+        self.j0.leftStick().onTrue(InstantCommand(profiler.toggle))
+
         # 7. Finally, a command to take input from joystick *later* ("lambda" = later)
         # and drive using that input as control speed signal
         drive = ArcadeDrive(
@@ -112,20 +168,40 @@ class RobotContainer:
         self.drivetrain.setDefaultCommand(drive)
 
     def getAutonomousCommand(self):
-        resetOdometry = InstantCommand(self.drivetrain.resetOdometry)
+        from commands.followroute import FollowRoute
+
+        resetOdometry = InstantCommand(self.resetOdometry)
         startStopwatch = InstantCommand(self.stopwatch.start)
         stopStopwatch = InstantCommand(self.stopwatch.stop)
 
-        # a little race with stopwatch
+        # a little race with stopwatch: one continuous route through the corners of a square
+        # (with GoToPoint(25, 0, ...).andThen(GoToPoint(25, 25, ...))... the robot would stop at every corner)
+        # and a split time at every corner (see self.stopwatch.statistics() and .exportCsv() after a few runs)
+        route = FollowRoute([(0, 0), (25, 0), (25, 25), (0, 25), (0, 0)], self.drivetrain, 1.0,
+                            onWaypoint=lambda waypoint: self.stopwatch.split())
         autoCommand = (resetOdometry
                        .andThen(startStopwatch)
-                       .andThen(GoToPoint(25, 0, self.drivetrain, 1.0, slowDownAtFinish=False))
-                       .andThen(GoToPoint(25, 25, self.drivetrain, 1.0, slowDownAtFinish=False))
-                       .andThen(GoToPoint(0, 25, self.drivetrain, 1.0, slowDownAtFinish=False))
-                       .andThen(GoToPoint(0, 0, self.drivetrain, 1.0, slowDownAtFinish=True))
+                       .andThen(route)
                        .andThen(stopStopwatch))
 
         return autoCommand
 
-    def teleopInit(self):
+    def instrumentLoopTiming(self, loopTiming):
+        """Measure how long the periodic() of our subsystems and the steps of our commands take"""
+        from commands.aimtodirection import AimToDirection
+        from commands.gotopoint import GoToPoint
+        from commands.followroute import FollowRoute
+        from commands.followline import FollowLine
+
+        for subsystem in (self.drivetrain, self.arm, self.lineSensor, self.occupancyGrid, self.stopwatch):
+            loopTiming.instrumentSubsystem(subsystem)
+        for commandClass in (ArcadeDrive, DriveDistance, RotateAngle, AimToDirection, GoToPoint, FollowRoute, FollowLine):
+            loopTiming.instrumentCommandClass(commandClass)
+
+    def resetOdometry(self):
+        """Reset the robot coordinates (and forget the obstacle map, which was in the old coordinates)"""
         self.drivetrain.resetOdometry()
+        self.occupancyGrid.clear()
+
+    def teleopInit(self):
+        self.resetOdometry()
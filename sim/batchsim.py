@@ -0,0 +1,291 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Simulates thousands of XRPs at once (one per set of gains), to tune GoToPoint and AimToDirection constants.
+
+The control laws of GoToPoint.execute/isFinished and AimToDirection.execute are rewritten here with NumPy
+arrays (one element per robot), together with the drivetrain mixing and the XRPPlant motor model.
+
+    python -m sim.batchsim    # grid search over the square race (driven with GoToPoint)
+"""
+
+import argparse
+import itertools
+
+import numpy as np
+
+from commands.aimtodirection import AimToDirectionConstants
+from commands.gotopoint import GoToPointConstants
+from sim.xrpplant import XRPPlant
+from subsystems.drivetrain import Drivetrain
+
+# the square race as a chain of GoToPoint commands: (x, y, slowDownAtFinish)
+# (RobotContainer.getAutonomousCommand drives the same square with FollowRoute, which is not modelled here:
+#  the gains searched here are those of GoToPoint and AimToDirection, FollowRoute only borrows a few of them)
+kSquareRace = ((25, 0, False), (25, 25, False), (0, 25, False), (0, 0, True))
+
+
+def clip(x, minimum, maximum):
+    return np.minimum(np.maximum(x, minimum), maximum)
+
+
+def toLeftRightSpeeds(fwd, rot):
+    """Same as drivetrain._to_left_right_speeds, for arrays"""
+    rot = clip(rot, -1.0, +1.0)
+    maxFwd = 1.0 - np.abs(rot)
+    fwd = clip(fwd, -maxFwd, +maxFwd)
+    return fwd - rot, fwd + rot
+
+
+class SigmaDeltaModulators:
+    """Same as drivetrain.SigmaDeltaModulator, for arrays (one modulator per robot)"""
+
+    def __init__(self, n: int, minEffort: float = Drivetrain.kMinProductiveEffort):
+        self.minEffort = minEffort
+        self.error = np.zeros(n)
+
+    def modulate(self, effort):
+        small = (effort != 0) & (np.abs(effort) <= self.minEffort)
+        error = self.error + effort
+        pulse = np.where(error >= 0.5 * self.minEffort, self.minEffort,
+                         np.where(error <= -0.5 * self.minEffort, -self.minEffort, 0.0))
+        self.error = np.where(small, error - pulse, 0.0)
+        return np.where(small, pulse, effort)
+
+
+def wrapDegrees(degrees):
+    return (degrees + 180.0) % 360.0 - 180.0
+
+
+def aimToDirectionControl(degreesRemaining, kP, kMinTurnSpeed, speed=1.0, fwdSpeed=0.0):
+    """AimToDirection.execute: returns (fwd, rot) arrays for arcadeDrive"""
+    turnSpeed = np.minimum(speed, kP * np.abs(degreesRemaining))
+    turnSpeed = np.maximum(turnSpeed, kMinTurnSpeed)
+    rot = np.where(degreesRemaining > 0, turnSpeed, -turnSpeed)
+    return np.full_like(rot, fwdSpeed), rot
+
+
+def goToPointControl(x, y, headingDegrees, targetX, targetY, initialDirection, pointingInGoodDirection, stop,
+                     kP, kPTranslate, kMinTranslateSpeed, kOversteerAdjustment, speed=1.0):
+    """
+    GoToPoint.execute: returns (fwd, rot, pointingInGoodDirection) arrays
+    """
+    # 1. to which direction we should be pointing?
+    dx, dy = targetX - x, targetY - y
+    targetDirection = np.degrees(np.arctan2(dy, dx))
+    degreesRemaining = wrapDegrees(targetDirection - headingDegrees)
+
+    # 2. if pointing in a very wrong direction, rotate without moving (GoToPoint uses +speed for both sides)
+    rotateInPlace = (np.abs(degreesRemaining) > 45) & ~pointingInGoodDirection
+    pointingInGoodDirection = pointingInGoodDirection | ~rotateInPlace
+
+    # 3. oversteer adjustment
+    adjustment = clip(kOversteerAdjustment * wrapDegrees(targetDirection - initialDirection), -20, 20)
+    degreesRemaining = wrapDegrees(targetDirection + adjustment - headingDegrees)
+
+    # 4. turn speed
+    rotateSpeed = np.minimum(abs(speed), kP * np.abs(degreesRemaining))
+
+    # 5. translation speed
+    distanceRemaining = np.hypot(dx, dy)
+    translateSpeed = np.where(stop, np.minimum(speed, kPTranslate * distanceRemaining), speed)
+    translateSpeed = np.maximum(translateSpeed, kMinTranslateSpeed)
+
+    # 6. turn left or right
+    rot = np.where(degreesRemaining < 0, -rotateSpeed, rotateSpeed)
+    fwd = np.where(rotateInPlace, 0.0, translateSpeed)
+    rot = np.where(rotateInPlace, speed, rot)
+    return fwd, rot, pointingInGoodDirection
+
+
+def goToPointFinished(x, y, targetX, targetY, initialX, initialY, initialDistance, stop,
+                      kPTranslate, kMinTranslateSpeed):
+    """GoToPoint.isFinished, for arrays"""
+    translateSpeed = kPTranslate * np.hypot(targetX - x, targetY - y)
+    tooSlowNow = (translateSpeed < 0.125 * kMinTranslateSpeed) & stop
+    return (np.hypot(x - initialX, y - initialY) >= initialDistance) | tooSlowNow
+
+
+class BatchPlant:
+    """XRPPlant kinematics for many robots at once (positions in inches, heading in radians)"""
+
+    def __init__(self, n: int):
+        self.x = np.zeros(n)
+        self.y = np.zeros(n)
+        self.heading = np.zeros(n)
+        self.leftVelocity = np.zeros(n)
+        self.rightVelocity = np.zeros(n)
+
+    def update(self, leftEffort, rightEffort, dt: float) -> None:
+        follow = 1.0 - np.exp(-dt / XRPPlant.kMotorTimeConstant)
+        self.leftVelocity += (_wheelSpeed(leftEffort) - self.leftVelocity) * follow
+        self.rightVelocity += (_wheelSpeed(rightEffort) - self.rightVelocity) * follow
+        speed = 0.5 * (self.leftVelocity + self.rightVelocity)
+        turnRate = (self.rightVelocity - self.leftVelocity) / Drivetrain.kTrackWidthInch
+        midHeading = self.heading + 0.5 * turnRate * dt
+        self.x += speed * np.cos(midHeading) * dt
+        self.y += speed * np.sin(midHeading) * dt
+        self.heading += turnRate * dt
+
+    def headingDegrees(self):
+        return wrapDegrees(np.degrees(self.heading))
+
+
+def simulateRace(kP, kPTranslate, kMinTranslateSpeed, kOversteerAdjustment,
+                 waypoints=kSquareRace, speed: float = 1.0, period: float = 0.02, maxSeconds: float = 30.0) -> dict:
+    """
+    Drive a chain of GoToPoint commands with every gain set at once (gains are arrays of the same shape).
+
+    :returns: dict of arrays: "lapTime" (seconds, inf if not finished) and "finalError" (inches from the last point)
+    """
+    kP, kPTranslate, kMinTranslateSpeed, kOversteerAdjustment = (
+        np.asarray(a, dtype=float).ravel() for a in
+        np.broadcast_arrays(kP, kPTranslate, kMinTranslateSpeed, kOversteerAdjustment))
+    n = kP.size
+    points = np.asarray(waypoints, dtype=float)
+    lastLeg = len(points) - 1
+
+    plant = BatchPlant(n)
+    leg = np.zeros(n, dtype=int)
+    done = np.zeros(n, dtype=bool)
+    lapTime = np.full(n, np.inf)
+    finalError = np.full(n, np.nan)
+    leftEffort, rightEffort = np.zeros(n), np.zeros(n)
+    leftModulator, rightModulator = SigmaDeltaModulators(n), SigmaDeltaModulators(n)
+
+    def initialize(which):
+        # GoToPoint.initialize, for the robots which just started a new leg
+        initialX[which], initialY[which] = plant.x[which], plant.y[which]
+        dx, dy = points[leg[which], 0] - initialX[which], points[leg[which], 1] - initialY[which]
+        initialDirection[which] = np.degrees(np.arctan2(dy, dx))
+        initialDistance[which] = np.hypot(dx, dy)
+        good[which] = False
+
+    initialX, initialY, initialDirection, initialDistance = np.zeros(n), np.zeros(n), np.zeros(n), np.zeros(n)
+    good = np.zeros(n, dtype=bool)
+    initialize(np.ones(n, dtype=bool))
+
+    t = 0.0
+    for _ in range(int(round(maxSeconds / period))):
+        t += period
+        plant.update(leftEffort, rightEffort, period)
+        x, y, heading = plant.x, plant.y, plant.headingDegrees()
+        targetX, targetY, stop = points[leg, 0], points[leg, 1], points[leg, 2] != 0
+
+        fwd, rot, good = goToPointControl(x, y, heading, targetX, targetY, initialDirection, good, stop,
+                                          kP, kPTranslate, kMinTranslateSpeed, kOversteerAdjustment, speed)
+        left, right = toLeftRightSpeeds(fwd, rot)
+        leftEffort = leftModulator.modulate(left)
+        rightEffort = rightModulator.modulate(right)
+
+        finished = ~done & goToPointFinished(x, y, targetX, targetY, initialX, initialY, initialDistance, stop,
+                                             kPTranslate, kMinTranslateSpeed)
+        stopped = finished | done
+        leftEffort[stopped] = 0.0  # GoToPoint.end()
+        rightEffort[stopped] = 0.0
+
+        completed = finished & (leg == lastLeg)
+        lapTime[completed] = t
+        finalError[completed] = np.hypot(x[completed] - targetX[completed], y[completed] - targetY[completed])
+        done |= completed
+
+        nextLeg = finished & ~completed
+        if nextLeg.any():
+            leg[nextLeg] += 1
+            initialize(nextLeg)
+        if done.all():
+            break
+
+    unfinished = ~done
+    finalError[unfinished] = np.hypot(plant.x[unfinished] - points[-1, 0], plant.y[unfinished] - points[-1, 1])
+    return {"lapTime": lapTime, "finalError": finalError}
+
+
+def simulateAim(kP, kMinTurnSpeed, targetDegrees: float = 90.0, period: float = 0.02, maxSeconds: float = 5.0) -> dict:
+    """
+    Turn in place with AimToDirection for every gain set at once.
+
+    :returns: dict of arrays: "time" (seconds until AimToDirection.isFinished, inf if never) and "finalError" (degrees)
+    """
+    kP, kMinTurnSpeed = (np.asarray(a, dtype=float).ravel() for a in np.broadcast_arrays(kP, kMinTurnSpeed))
+    n = kP.size
+    plant = BatchPlant(n)
+    done = np.zeros(n, dtype=bool)
+    finishTime = np.full(n, np.inf)
+    finalError = np.full(n, np.nan)
+    leftEffort, rightEffort = np.zeros(n), np.zeros(n)
+    leftModulator, rightModulator = SigmaDeltaModulators(n), SigmaDeltaModulators(n)
+
+    t = 0.0
+    for _ in range(int(round(maxSeconds / period))):
+        t += period
+        plant.update(leftEffort, rightEffort, period)
+        degreesRemaining = wrapDegrees(targetDegrees - plant.headingDegrees())
+        fwd, rot = aimToDirectionControl(degreesRemaining, kP, kMinTurnSpeed)
+        left, right = toLeftRightSpeeds(fwd, rot)
+        leftEffort = leftModulator.modulate(left)
+        rightEffort = rightModulator.modulate(right)
+
+        turnRate = np.degrees(plant.rightVelocity - plant.leftVelocity) / Drivetrain.kTrackWidthInch
+        finished = ~done & (np.abs(degreesRemaining) < AimToDirectionConstants.kAngleToleranceDegrees) & (
+            np.abs(turnRate) < AimToDirectionConstants.kAngleVelocityToleranceDegreesPerSec)
+        finishTime[finished] = t
+        finalError[finished] = degreesRemaining[finished]
+        done |= finished
+        leftEffort[done] = 0.0
+        rightEffort[done] = 0.0
+        if done.all():
+            break
+
+    finalError[~done] = wrapDegrees(targetDegrees - plant.headingDegrees()[~done])
+    return {"time": finishTime, "finalError": finalError}
+
+
+def gridSearch(kP, kPTranslate, kMinTranslateSpeed, kOversteerAdjustment, maxError: float = 2.0, **kwargs) -> list:
+    """
+    Try every combination of the given gain values on the square race.
+
+    :returns: list of (lapTime, finalError, gains dict), fastest first, only for runs within maxError inches
+    """
+    grid = np.array(list(itertools.product(kP, kPTranslate, kMinTranslateSpeed, kOversteerAdjustment)))
+    result = simulateRace(grid[:, 0], grid[:, 1], grid[:, 2], grid[:, 3], **kwargs)
+    names = ("kP", "kPTranslate", "kMinTranslateSpeed", "kOversteerAdjustment")
+    rows = []
+    for i in np.argsort(result["lapTime"]):
+        if result["finalError"][i] <= maxError and np.isfinite(result["lapTime"][i]):
+            rows.append((result["lapTime"][i], result["finalError"][i], dict(zip(names, grid[i]))))
+    return rows
+
+
+def _wheelSpeed(effort):
+    # same motor deadband as XRPPlant
+    speed = clip(effort, -1.0, 1.0) * Drivetrain.kMaxSpeedInchPerSecond
+    return np.where(np.abs(effort) < Drivetrain.kMinProductiveEffort, 0.0, speed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="grid search of GoToPoint gains on the square race")
+    parser.add_argument("--top", type=int, default=10, help="how many best gain sets to print")
+    parser.add_argument("--max-error", type=float, default=2.0, help="max final position error (inches)")
+    args = parser.parse_args()
+
+    rows = gridSearch(
+        kP=np.linspace(0.001, 0.02, 20),
+        kPTranslate=np.linspace(0.01, 0.1, 10),
+        kMinTranslateSpeed=np.linspace(0.2, 0.6, 9),
+        kOversteerAdjustment=np.linspace(0.0, 1.0, 11),
+        maxError=args.max_error,
+    )
+    print(f"current: kP={AimToDirectionConstants.kP} kPTranslate={GoToPointConstants.kPTranslate} "
+          f"kMinTranslateSpeed={GoToPointConstants.kMinTranslateSpeed} "
+          f"kOversteerAdjustment={GoToPointConstants.kOversteerAdjustment}")
+    for lapTime, finalError, gains in rows[:args.top]:
+        print(f"{lapTime:6.2f}s  error={finalError:5.2f}in  " + "  ".join(f"{k}={v:.4g}" for k, v in gains.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Runs the autonomous routine on a fleet of simulated XRPs, one robot per process (each with its own
+RobotContainer, CommandScheduler and XRPPlant), on all CPU cores, and reports the race times and final poses.
+
+Every robot gets a seed, which decides how unequal its motors are (real XRPs never drive exactly straight).
+
+    python -m sim.fleet --robots 32
+    python -m sim.fleet --robots 32 --routine mymodule:makeCommand --json fleet.json
+"""
+
+import argparse
+import concurrent.futures
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+
+def loadRoutine(name: str):
+    """:returns: the function(container) -> command named like "module:function" (or None, for the default)"""
+    if not name:
+        return None
+    moduleName, functionName = name.split(":")
+    return getattr(importlib.import_module(moduleName), functionName)
+
+
+def runRobot(index: int, seed: int, routineName: str = None, seconds: float = 30.0, period: float = 0.02,
+             motorGainSpread: float = 0.05) -> dict:
+    """
+    Run one simulated robot (call this in a fresh process: the HAL devices and the scheduler are process-wide)
+
+    :param seed: decides the motor gains of this robot
+    :param routineName: "module:function", where function(container) -> command (default = autonomous command)
+    :param motorGainSpread: motor gains are 1.0 plus minus this much (normal distribution)
+    """
+    from wpilib.simulation import resumeTiming
+
+    from robotcontainer import RobotContainer
+    from sim.headless import runAutonomous
+    from sim.xrpplant import XRPPlant
+    from utils.clock import clock
+
+    random.seed(seed)
+    np.random.seed(seed % (1 << 32))
+    rng = random.Random(seed)
+    leftGain = 1.0 + rng.gauss(0.0, motorGainSpread)
+    rightGain = 1.0 + rng.gauss(0.0, motorGainSpread)
+    try:
+        container = RobotContainer()
+        plant = XRPPlant(leftMotorGain=leftGain, rightMotorGain=rightGain)
+        result = runAutonomous(container, plant, loadRoutine(routineName), seconds=seconds, period=period)
+    finally:
+        clock.useFPGA()
+        resumeTiming()
+    result.update(
+        index=index,
+        seed=seed,
+        leftMotorGain=leftGain,
+        rightMotorGain=rightGain,
+        raceSeconds=container.stopwatch.lastElapsed,
+        raceSplits=list(container.stopwatch.currentSplits),
+        pid=os.getpid(),
+    )
+    return result
+
+
+def runFleet(robots: int, seed: int = 0, routineName: str = None, seconds: float = 30.0, period: float = 0.02,
+             motorGainSpread: float = 0.05, workers: int = None) -> dict:
+    """
+    Run `robots` simulated robots on a process pool (every robot in a new process)
+
+    :returns: {"robots": [result of each runRobot], "summary": aggregated statistics}
+    """
+    workers = workers or os.cpu_count() or 1
+    wallStart = time.perf_counter()
+    # (spawn, and one task per process: a forked or reused process would share the HAL and the scheduler)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                                max_tasks_per_child=1) as pool:
+        futures = [pool.submit(runRobot, i, seed + i, routineName, seconds, period, motorGainSpread)
+                   for i in range(robots)]
+        results = []
+        for i, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({"index": i, "seed": seed + i, "error": repr(e)})
+    wallSeconds = time.perf_counter() - wallStart
+    return {"robots": results, "summary": summarize(results, wallSeconds, workers)}
+
+
+def summarize(results: list, wallSeconds: float, workers: int) -> dict:
+    ok = [r for r in results if "error" not in r]
+    finished = [r for r in ok if r["finished"]]
+    raceTimes = np.array([r["raceSeconds"] for r in finished if r["raceSeconds"] is not None])
+    poses = np.array([(r["x"], r["y"], r["headingDegrees"]) for r in ok]).reshape(-1, 3)
+    summary = {
+        "robots": len(results),
+        "errors": len(results) - len(ok),
+        "finished": len(finished),
+        "workers": workers,
+        "wallSeconds": wallSeconds,
+        "robotsPerSecond": len(results) / wallSeconds if wallSeconds > 0 else float("inf"),
+        "simSecondsPerWallSecond": sum(r["simSeconds"] for r in ok) / wallSeconds if wallSeconds > 0 else 0.0,
+    }
+    if len(raceTimes):
+        summary.update(
+            raceSecondsMin=float(raceTimes.min()),
+            raceSecondsMean=float(raceTimes.mean()),
+            raceSecondsP90=float(np.percentile(raceTimes, 90)),
+            raceSecondsMax=float(raceTimes.max()),
+        )
+    splitCount = max((len(r["raceSplits"]) for r in finished), default=0)
+    for k in range(splitCount):
+        splits = np.array([r["raceSplits"][k] for r in finished if len(r["raceSplits"]) > k])
+        summary[f"split{k + 1}SecondsMean"] = float(splits.mean())
+        summary[f"split{k + 1}SecondsP90"] = float(np.percentile(splits, 90))
+    if len(poses):
+        summary.update(
+            finalXMean=float(poses[:, 0].mean()),
+            finalYMean=float(poses[:, 1].mean()),
+            finalPositionSpread=float(np.hypot(poses[:, 0] - poses[:, 0].mean(), poses[:, 1] - poses[:, 1].mean()).max()),
+            finalHeadingMean=float(poses[:, 2].mean()),
+        )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run the autonomous routine on a fleet of simulated XRPs")
+    parser.add_argument("--robots", type=int, default=os.cpu_count() or 1, help="how many robots")
+    parser.add_argument("--workers", type=int, default=None, help="processes at once (default: one per core)")
+    parser.add_argument("--seed", type=int, default=0, help="robot i gets seed + i")
+    parser.add_argument("--routine", default=None, help="module:function(container) -> command")
+    parser.add_argument("--seconds", type=float, default=30.0, help="simulated time limit per robot")
+    parser.add_argument("--spread", type=float, default=0.05, help="motor gain spread between robots")
+    parser.add_argument("--json", default=None, help="also write the full report into this JSON file")
+    args = parser.parse_args()
+
+    report = runFleet(args.robots, args.seed, args.routine, args.seconds, motorGainSpread=args.spread,
+                      workers=args.workers)
+    for r in report["robots"]:
+        if "error" in r:
+            print(f"robot {r['index']:3d} (seed {r['seed']}): {r['error']}")
+            continue
+        race = f"{r['raceSeconds']:6.2f}s" if r["raceSeconds"] is not None else "   n/a"
+        print(f"robot {r['index']:3d} (seed {r['seed']}): race {race}, finished={r['finished']}, "
+              f"final pose ({r['x']:6.2f}, {r['y']:6.2f}, {r['headingDegrees']:7.2f})")
+    for key, value in report["summary"].items():
+        print(f"{key:>24s}: {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
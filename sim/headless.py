@@ -0,0 +1,95 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Runs the autonomous routine against the XRPPlant model, with a virtual clock (faster than real time).
+
+    python -m sim.headless --seconds 30
+"""
+
+import argparse
+import time
+
+import commands2
+from wpilib.simulation import DriverStationSim, resumeTiming
+
+from sim.xrpplant import XRPPlant
+from utils.clock import clock
+from utils.telemetry import telemetry
+
+
+def enableAutonomous() -> None:
+    DriverStationSim.setDsAttached(True)
+    DriverStationSim.setAutonomous(True)
+    DriverStationSim.setEnabled(True)
+    DriverStationSim.notifyNewData()
+
+
+def runAutonomous(container=None, plant: XRPPlant = None, routine=None,
+                  seconds: float = 30.0, period: float = 0.02) -> dict:
+    """
+    Run one autonomous routine until it finishes (or until the time runs out).
+
+    :param container: the RobotContainer (a new one is made if not given)
+    :param plant: the plant model (a new one is made if not given)
+    :param routine: function(container) -> command, by default container.getAutonomousCommand()
+    :param seconds: give up after this much simulated time
+    :param period: the scheduler period (seconds)
+    :returns: simulated and wall clock time, and the final pose of the plant
+    """
+    from robotcontainer import RobotContainer
+
+    virtualClock = clock.useVirtual()
+    enableAutonomous()
+    if container is None:
+        container = RobotContainer()
+    if plant is None:
+        plant = XRPPlant()
+    command = routine(container) if routine is not None else container.getAutonomousCommand()
+
+    scheduler = commands2.CommandScheduler.getInstance()
+    scheduler.schedule(command)
+    start = clock.tick()
+    wallStart = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < seconds:
+        plant.update(period)
+        virtualClock.step(period)
+        clock.tick()
+        scheduler.run()
+        telemetry.flush()
+        elapsed = clock.now() - start
+        if not scheduler.isScheduled(command):
+            break
+    wallTime = time.perf_counter() - wallStart
+
+    x, y, heading = plant.getPose()
+    return {
+        "finished": not scheduler.isScheduled(command),
+        "simSeconds": elapsed,
+        "wallSeconds": wallTime,
+        "speedup": elapsed / wallTime if wallTime > 0 else float("inf"),
+        "x": x,
+        "y": y,
+        "headingDegrees": heading,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run the autonomous routine on a simulated XRP")
+    parser.add_argument("--seconds", type=float, default=30.0, help="simulated time limit")
+    args = parser.parse_args()
+    try:
+        result = runAutonomous(seconds=args.seconds)
+    finally:
+        clock.useFPGA()
+        resumeTiming()
+    for key, value in result.items():
+        print(f"{key:>16s}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Replays flight recorder logs through the current command code, and compares the motor commands it computes
+with the recorded ones (a fast regression check of GoToPoint/AimToDirection/... changes against real runs).
+
+    python -m sim.replay logs/*.xrprec
+"""
+
+import argparse
+import math
+import sys
+
+import commands2
+import numpy as np
+from wpilib.simulation import resumeTiming
+from wpimath.geometry import Pose2d, Rotation2d
+
+from sim.headless import enableAutonomous
+from subsystems.drivetrain import SensorFrame
+from utils.clock import clock
+from utils.flightrecorder import readCommandNames, readLog
+
+
+def frameFromRecord(record) -> SensorFrame:
+    # (the frame gets the distances which the odometry got, like Drivetrain.getFrame: not the raw encoder counts,
+    #  which still include the wheel slip)
+    return SensorFrame(
+        float(record["timestamp"]),
+        Pose2d(float(record["poseX"]), float(record["poseY"]),
+               Rotation2d.fromDegrees(float(record["poseHeadingDegrees"]))),
+        float(record["leftDistance"]),
+        float(record["rightDistance"]),
+        float(record["gyroRateZ"]),
+        float(record["distanceToObstacle"]),
+        float(record["leftReflectance"]),
+        float(record["rightReflectance"]),
+    )
+
+
+def findStart(records, names: dict, commandName: str = None) -> int:
+    """
+    :returns: index of the first record where the command (or, by default, anything but ArcadeDrive)
+      was using the drivetrain, or -1 if there is no such record
+    """
+    wanted = [i for i, name in names.items() if (name == commandName if commandName else name != "ArcadeDrive")]
+    matches = np.flatnonzero(np.isin(records["commandId"], wanted))
+    return int(matches[0]) if len(matches) else -1
+
+
+def replay(path: str, container, routine=None, commandName: str = None, tolerance: float = 1e-3) -> dict:
+    """
+    Feed the recorded sensor snapshots into the Drivetrain, run the command stack on them with a virtual clock
+    (as fast as possible), and diff the new leftSpeed/rightSpeed against the recorded ones.
+
+    :param path: flight recorder log file
+    :param container: the RobotContainer to run
+    :param routine: function(container) -> command to replay, by default container.getAutonomousCommand()
+    :param commandName: where to start the replay (the first record where this command ran)
+    :param tolerance: speeds differing by more than this count as a divergence
+    """
+    records = readLog(path)
+    names = readCommandNames(path)
+    start = findStart(records, names, commandName)
+    if start < 0:
+        return {"path": path, "ticks": 0, "error": "no matching command in the log"}
+
+    drivetrain = container.drivetrain
+    scheduler = commands2.CommandScheduler.getInstance()
+    scheduler.cancelAll()
+    drivetrain.resetState()  # (nothing learned or ramped while replaying the previous log may carry over)
+    inchesPerCount = math.pi * drivetrain.kWheelDiameterInch / drivetrain.kCountsPerRevolution
+
+    command = routine(container) if routine is not None else container.getAutonomousCommand()
+    scheduler.schedule(command)
+
+    virtualClock = clock.useVirtual()
+    n = len(records) - start
+    computed = np.zeros((n, 2))
+    previousTimestamp = float(records["timestamp"][start])
+    ticks = 0
+    try:
+        for i in range(n):
+            record = records[start + i]
+            timestamp = float(record["timestamp"])
+            if timestamp > previousTimestamp:
+                virtualClock.step(timestamp - previousTimestamp)
+            previousTimestamp = timestamp
+            clock.tick()
+            # (raw encoder counts, accelerometer and gyro go to the slip estimator: the traction limit is learned again)
+            encoderCounts = int(record["leftEncoderCount"]) + int(record["rightEncoderCount"])
+            encoderDistance = 0.5 * encoderCounts * inchesPerCount
+            drivetrain.setReplayFrame(frameFromRecord(record), encoderDistance, float(record["accelX"]),
+                                      float(record["gyroAngleZ"]))
+            scheduler.run()
+            computed[i] = drivetrain.leftSpeed, drivetrain.rightSpeed
+            ticks = i + 1
+            if not scheduler.isScheduled(command):
+                break
+    finally:
+        drivetrain.setReplayFrame(None)
+        scheduler.cancelAll()
+
+    recorded = np.stack([records["leftSpeed"][start:start + ticks], records["rightSpeed"][start:start + ticks]], axis=1)
+    difference = np.abs(computed[:ticks] - recorded)
+    diverged = np.flatnonzero(difference.max(axis=1) > tolerance)
+    return {
+        "path": path,
+        "ticks": ticks,
+        "maxDifference": float(difference.max()) if ticks else 0.0,
+        "meanDifference": float(difference.mean()) if ticks else 0.0,
+        "firstDivergence": int(diverged[0]) if len(diverged) else -1,  # (tick number, counting from the start)
+        "divergedTicks": int(len(diverged)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay flight recorder logs against the current command code")
+    parser.add_argument("logs", nargs="+", help="flight recorder log files")
+    parser.add_argument("--command", default=None, help="start the replay where this command first ran")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="max allowed speed difference")
+    args = parser.parse_args()
+
+    from robotcontainer import RobotContainer
+
+    clock.useVirtual()
+    enableAutonomous()
+    failed = 0
+    try:
+        container = RobotContainer()
+        for path in args.logs:
+            result = replay(path, container, commandName=args.command, tolerance=args.tolerance)
+            if "error" in result:
+                print(f"{path}: {result['error']}")
+                continue
+            status = "OK" if result["divergedTicks"] == 0 else f"DIVERGED at tick {result['firstDivergence']}"
+            failed += result["divergedTicks"] != 0
+            print(f"{path}: {status}, {result['ticks']} ticks, max difference {result['maxDifference']:.4f}")
+    finally:
+        clock.useFPGA()
+        resumeTiming()
+    print(f"{len(args.logs) - failed} of {len(args.logs)} logs replayed without divergence")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
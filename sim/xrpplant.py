@@ -0,0 +1,187 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+A kinematic model of the XRP, so that robot code can run without a physical robot.
+
+It reads the XRPMotor outputs from the HAL simulation and writes back what the robot sensors would see:
+encoders (DIO 4/5 and 6/7), XRPGyro, XRPRangefinder, reflectance sensor and the built-in accelerometer.
+With maxTractionAcceleration, the wheels slip when they speed up (or brake) faster than that: the encoders then
+count more than the robot really travels.
+"""
+
+import math
+
+from wpilib.simulation import AnalogInputSim, BuiltInAccelerometerSim, EncoderSim, SimDeviceSim
+
+from subsystems.drivetrain import Drivetrain
+
+kMetersPerInch = 0.0254
+kGravityInchPerSecSquared = 386.09
+
+
+class XRPPlant:
+    kMotorTimeConstant = 0.08  # seconds, how quickly the wheel speed follows the motor effort
+    kRangefinderOffsetInch = 3.0  # the rangefinder is in front of the robot center
+    kRangefinderMaxMeters = 4.0
+    kReflectanceFloor = 0.1  # reflectance value of a plain (white) floor
+
+    def __init__(self, x: float = 0.0, y: float = 0.0, headingDegrees: float = 0.0,
+                 arena=(-40.0, -40.0, 70.0, 70.0), obstacles=(), floor=None,
+                 leftMotorGain: float = 1.0, rightMotorGain: float = 1.0,
+                 maxTractionAcceleration: float = math.inf):
+        """
+        :param x, y, headingDegrees: where the robot starts (inches, degrees)
+        :param arena: (xmin, ymin, xmax, ymax) walls around the robot, in inches (rangefinder sees them)
+        :param obstacles: more boxes like (xmin, ymin, xmax, ymax) which the rangefinder can see
+        :param floor: optional function floor(x, y) -> reflectance between 0.0 and 1.0 (for line following)
+        :param leftMotorGain, rightMotorGain: to model motors which are not exactly equally strong
+        :param maxTractionAcceleration: the floor cannot speed up or slow down a wheel faster than this
+          (inches per second squared), beyond that the wheel slips
+        """
+        self.x = x
+        self.y = y
+        self.heading = math.radians(headingDegrees)
+        self.leftVelocity = 0.0
+        self.rightVelocity = 0.0
+        self.leftGroundVelocity = 0.0  # (how fast the wheels really move over the floor, slower if they slip)
+        self.rightGroundVelocity = 0.0
+        self.leftDistance = 0.0
+        self.rightDistance = 0.0
+        self.acceleration = 0.0
+        self.boxes = [tuple(arena)] + [tuple(box) for box in obstacles]
+        self.floor = floor
+        self.leftMotorGain = leftMotorGain
+        self.rightMotorGain = rightMotorGain
+        self.maxTractionAcceleration = maxTractionAcceleration
+
+        # (the names under which robotpy-xrp registers the motors on PWM channels 0 and 1, and the gyro)
+        self.leftMotorSpeed = _findDouble("XRPMotor:motorL", "speed")
+        self.rightMotorSpeed = _findDouble("XRPMotor:motorR", "speed")
+        self.gyroAngleZ = _findDouble("Gyro:XRPGyro", "angle_z")
+        self.gyroRateZ = _findDouble("Gyro:XRPGyro", "rate_z")
+
+        self.leftEncoder = EncoderSim.createForChannel(4)
+        self.rightEncoder = EncoderSim.createForChannel(6)
+        self.rangefinder = AnalogInputSim(2)
+        self.leftReflectance = AnalogInputSim(0)
+        self.rightReflectance = AnalogInputSim(1)
+        self.accelerometer = BuiltInAccelerometerSim()
+
+        self.distancePerCount = math.pi * Drivetrain.kWheelDiameterInch / Drivetrain.kCountsPerRevolution
+        self._writeSensors(0.0)
+
+    def update(self, dt: float) -> None:
+        """Advance the model by dt seconds, using the latest motor outputs"""
+        if dt <= 0:
+            return
+        # 1. motors: the right motor is mounted mirrored, so its positive output drives the wheel backwards
+        leftTarget = _wheelSpeed(self.leftMotorSpeed.get()) * self.leftMotorGain
+        rightTarget = -_wheelSpeed(self.rightMotorSpeed.get()) * self.rightMotorGain
+        follow = 1.0 - math.exp(-dt / self.kMotorTimeConstant)
+        previousSpeed = 0.5 * (self.leftGroundVelocity + self.rightGroundVelocity)
+        self.leftVelocity += (leftTarget - self.leftVelocity) * follow
+        self.rightVelocity += (rightTarget - self.rightVelocity) * follow
+
+        # 2. traction: the ground speed follows the wheel speed, but not faster than the floor allows
+        maxChange = self.maxTractionAcceleration * dt
+        self.leftGroundVelocity += _clip(self.leftVelocity - self.leftGroundVelocity, -maxChange, maxChange)
+        self.rightGroundVelocity += _clip(self.rightVelocity - self.rightGroundVelocity, -maxChange, maxChange)
+
+        # 3. differential drive kinematics (integrating at the midpoint heading)
+        speed = 0.5 * (self.leftGroundVelocity + self.rightGroundVelocity)
+        turnRate = (self.rightGroundVelocity - self.leftGroundVelocity) / Drivetrain.kTrackWidthInch
+        midHeading = self.heading + 0.5 * turnRate * dt
+        self.x += speed * math.cos(midHeading) * dt
+        self.y += speed * math.sin(midHeading) * dt
+        self.heading += turnRate * dt
+        self.leftDistance += self.leftVelocity * dt
+        self.rightDistance += self.rightVelocity * dt
+        self.acceleration = (speed - previousSpeed) / dt
+
+        self._writeSensors(turnRate)
+
+    def getPose(self):
+        """:returns: (x, y, headingDegrees) of the simulated robot, in inches and degrees"""
+        return self.x, self.y, math.degrees(self.heading)
+
+    def distanceToWall(self) -> float:
+        """:returns: distance from the rangefinder to the nearest wall or obstacle ahead, in inches"""
+        cos, sin = math.cos(self.heading), math.sin(self.heading)
+        x0 = self.x + self.kRangefinderOffsetInch * cos
+        y0 = self.y + self.kRangefinderOffsetInch * sin
+        nearest = math.inf
+        for box in self.boxes:
+            distance = _rayToBox(x0, y0, cos, sin, box)
+            if distance < nearest:
+                nearest = distance
+        return nearest
+
+    def _writeSensors(self, turnRate: float) -> None:
+        # encoders only change by whole counts, like the real ones
+        for encoder, distance, velocity in ((self.leftEncoder, self.leftDistance, self.leftVelocity),
+                                            (self.rightEncoder, self.rightDistance, self.rightVelocity)):
+            encoder.setDistance(round(distance / self.distancePerCount) * self.distancePerCount)
+            encoder.setRate(velocity)
+
+        self.gyroAngleZ.set(math.degrees(self.heading))
+        self.gyroRateZ.set(math.degrees(turnRate))
+        self.accelerometer.setX(self.acceleration / kGravityInchPerSecSquared)
+        self.accelerometer.setZ(1.0)
+
+        meters = min(self.distanceToWall() * kMetersPerInch, self.kRangefinderMaxMeters)
+        self.rangefinder.setVoltage(meters / self.kRangefinderMaxMeters * 5.0)
+
+        left, right = self.kReflectanceFloor, self.kReflectanceFloor
+        if self.floor is not None:
+            left, right = self._reflectance()
+        self.leftReflectance.setVoltage(left * 5.0)
+        self.rightReflectance.setVoltage(right * 5.0)
+
+    def _reflectance(self):
+        # the two reflectance sensors are in front of the wheels, 0.3 inch apart
+        cos, sin = math.cos(self.heading), math.sin(self.heading)
+        fx, fy = self.x + 1.5 * cos, self.y + 1.5 * sin
+        left = self.floor(fx - 0.15 * sin, fy + 0.15 * cos)
+        right = self.floor(fx + 0.15 * sin, fy - 0.15 * cos)
+        return left, right
+
+
+def _findDouble(deviceName: str, valueName: str):
+    # (SimDeviceSim of a device which doesn't exist is still truthy, but the values it returns are invalid)
+    value = SimDeviceSim(deviceName).getDouble(valueName)
+    if not value:
+        raise RuntimeError(f"simulated device {deviceName} with value {valueName} not found "
+                           "(was the Drivetrain created before XRPPlant?)")
+    return value
+
+
+def _clip(x: float, minimum: float, maximum: float) -> float:
+    return max(minimum, min(maximum, x))
+
+
+def _wheelSpeed(effort: float) -> float:
+    # XRP motors do not spin at all under kMinProductiveEffort
+    if abs(effort) < Drivetrain.kMinProductiveEffort:
+        return 0.0
+    return max(-1.0, min(1.0, effort)) * Drivetrain.kMaxSpeedInchPerSecond
+
+
+def _rayToBox(x0, y0, dx, dy, box) -> float:
+    # distance along the ray (x0, y0) + t * (dx, dy) to the first side of the box that it hits
+    xmin, ymin, xmax, ymax = box
+    nearest = math.inf
+    if dx != 0:
+        for wall in (xmin, xmax):
+            t = (wall - x0) / dx
+            if 0 <= t < nearest and ymin <= y0 + t * dy <= ymax:
+                nearest = t
+    if dy != 0:
+        for wall in (ymin, ymax):
+            t = (wall - y0) / dy
+            if 0 <= t < nearest and xmin <= x0 + t * dx <= xmax:
+                nearest = t
+    return nearest
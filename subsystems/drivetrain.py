@@ -5,6 +5,7 @@
 #
 
 import math
+import threading
 
 import commands2
 import wpilib
@@ -12,37 +13,365 @@ import xrp
 
 from wpimath.kinematics import DifferentialDriveOdometry
 from wpimath.geometry import Rotation2d, Pose2d, Translation2d
-from wpilib import SmartDashboard, Timer
+
+from utils.clock import clock
+from utils.posehistory import PoseHistory
+from utils.profile import TrapezoidProfile
+from utils.sensorregistry import SensorRegistry
+from utils.telemetry import telemetry
+
+
+class SensorFrame:
+    """
+    One consistent snapshot of the drivetrain sensors, captured once per scheduler tick
+    (so every command sees the same sample, and the hardware is only asked once).
+    With a sensor registry, the rangefinder and reflectance values are not in the snapshot: they are read from the
+    registry when asked for (so those sensors are only read if somebody wants them, at most once per tick)
+    """
+    __slots__ = ("timestamp", "pose", "x", "y", "headingDegrees",
+                 "leftDistance", "rightDistance", "gyroRateZ",
+                 "_distanceToObstacle", "_leftReflectance", "_rightReflectance", "_sensors")
+
+    def __init__(self, timestamp: float, pose: Pose2d, leftDistance: float, rightDistance: float,
+                 gyroRateZ: float, distanceToObstacle: float, leftReflectance: float, rightReflectance: float,
+                 sensors: SensorRegistry = None):
+        setattr_ = object.__setattr__
+        setattr_(self, "timestamp", timestamp)
+        setattr_(self, "pose", pose)
+        setattr_(self, "x", pose.x)
+        setattr_(self, "y", pose.y)
+        setattr_(self, "headingDegrees", pose.rotation().degrees())
+        setattr_(self, "leftDistance", leftDistance)
+        setattr_(self, "rightDistance", rightDistance)
+        setattr_(self, "gyroRateZ", gyroRateZ)
+        setattr_(self, "_distanceToObstacle", distanceToObstacle)
+        setattr_(self, "_leftReflectance", leftReflectance)
+        setattr_(self, "_rightReflectance", rightReflectance)
+        setattr_(self, "_sensors", sensors)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SensorFrame is immutable")
+
+    @property
+    def distanceToObstacle(self) -> float:
+        sensors = self._sensors
+        return self._distanceToObstacle if sensors is None else sensors.value("rangefinder")
+
+    @property
+    def leftReflectance(self) -> float:
+        sensors = self._sensors
+        return self._leftReflectance if sensors is None else sensors.value("left-reflectance")
+
+    @property
+    def rightReflectance(self) -> float:
+        sensors = self._sensors
+        return self._rightReflectance if sensors is None else sensors.value("right-reflectance")
+
+    def withPose(self, pose: Pose2d, leftDistance: float, rightDistance: float) -> "SensorFrame":
+        """A copy of this snapshot, but with a newer pose (other sensor values stay the same)"""
+        return SensorFrame(self.timestamp, pose, leftDistance, rightDistance, self.gyroRateZ,
+                           self._distanceToObstacle, self._leftReflectance, self._rightReflectance, self._sensors)
+
+    def location(self) -> Translation2d:
+        return self.pose.translation()
+
+    def heading(self) -> Rotation2d:
+        return self.pose.rotation()
+
+
+class SigmaDeltaModulator:
+    """
+    Makes a motor deliver a small effort which it cannot do directly (XRP motors do not spin under minEffort):
+    on each tick it outputs either 0 or +-minEffort, and keeps the accumulated error, so that over a few ticks
+    the average output equals the requested effort (for example, 0.2 -> 0.4, 0, 0.4, 0, ...)
+    """
+    __slots__ = ("minEffort", "error", "output", "average", "tickError", "tickAverage")
+
+    def __init__(self, minEffort: float):
+        self.minEffort = minEffort
+        self.error = 0.0  # requested minus delivered, accumulated over time
+        self.output = 0.0  # the latest output
+        self.average = 0.0  # moving average of the output (the effective effort), for telemetry
+        self.tickError = self.tickAverage = 0.0  # (error and average when this tick started)
+
+    def modulate(self, effort: float, sameTick: bool = False) -> float:
+        """
+        :param sameTick: this tick already called modulate() (then that call gets replaced by this one,
+          instead of advancing the modulation by one more step)
+        """
+        if sameTick:
+            self.error, self.average = self.tickError, self.tickAverage
+        else:
+            self.tickError, self.tickAverage = self.error, self.average
+        minEffort = self.minEffort
+        # 1. if effort is zero or above minEffort, just use that
+        if effort == 0 or abs(effort) > minEffort:
+            self.error = 0.0
+            output = effort
+        # 2. otherwise output +-minEffort only when the accumulated effort reaches half of it
+        else:
+            error = self.error + effort
+            if error >= 0.5 * minEffort:
+                output = minEffort
+            elif error <= -0.5 * minEffort:
+                output = -minEffort
+            else:
+                output = 0.0
+            self.error = error - output
+        self.output = output
+        self.average += 0.2 * (output - self.average)
+        return output
+
+    def bypass(self, effort: float, sameTick: bool = False) -> float:
+        """Output the effort as it is, without modulation (like modulate(), but even if it is under minEffort)"""
+        if sameTick:
+            self.average = self.tickAverage
+        else:
+            self.tickAverage = self.average
+        self.error = self.tickError = 0.0
+        self.output = effort
+        self.average += 0.2 * (effort - self.average)
+        return effort
+
+    def reset(self) -> None:
+        self.error = 0.0
+        self.output = 0.0
+        self.average = 0.0
+        self.tickError = self.tickAverage = 0.0
+
+
+class SlipEstimator:
+    """
+    Detects wheel slip by comparing the acceleration of the wheels (from the encoders) with the acceleration
+    of the robot body (from the accelerometer X axis): a spinning or skidding wheel accelerates faster than the body.
+    Meanwhile the body speed is tracked by integrating the accelerometer (and pulling it towards the wheel speed
+    while the wheels have grip), so during a slip we know how much of the wheel travel really happened.
+    In a turn the wheels accelerate differently: the outer one by the body acceleration plus the yaw acceleration
+    times half the track width (from the gyro), the inner one by that much less
+    """
+    kFilterSeconds = 0.04  # time constant of the low-pass filters on the wheel speed and the accelerations
+    kGripSeconds = 0.1  # while the wheels have grip, the body speed estimate follows the wheel speed this fast
+    kBiasSeconds = 2.0  # the accelerometer offset is learned while standing still, this slowly
+    kSlipThresholdInchPerSec2 = 20.0  # wheels accelerating this much more than the body = slipping
+    kMinSlipSeconds = 0.08  # (only if that lasts this long: sensor noise doesn't, a real slip does)
+    kRegainedGripInchPerSec = 1.0  # the slip is over when the wheel speed is back this close to the body speed
+    kMaxSlipSeconds = 0.5  # (and after this long, because the integrated accelerometer drifts)
+    kGravityInchPerSecSquared = 386.09
+    kHalfTrackWidthInch = 6.1 / 2  # (half of Drivetrain.kTrackWidthInch)
+
+    __slots__ = ("distance", "wheelSpeed", "wheelAcceleration", "bodySpeed", "measuredAcceleration",
+                 "bodyAcceleration", "heading", "yawRate", "yawAcceleration", "bias", "slipping", "slipSeconds",
+                 "slipCount", "slipAcceleration")
+
+    def __init__(self):
+        self.reset(None)
+        self.slipCount = 0  # how many slips were detected so far
+        self.slipAcceleration = 0.0  # how fast the faster wheel's ground contact was accelerating at the latest slip
+
+    def reset(self, distance) -> None:
+        self.distance = distance
+        self.wheelSpeed = self.wheelAcceleration = 0.0
+        self.bodySpeed = self.measuredAcceleration = self.bodyAcceleration = 0.0
+        self.heading = None
+        self.yawRate = self.yawAcceleration = 0.0  # (radians per second, and per second squared)
+        self.bias = 0.0
+        self.slipping = False
+        self.slipSeconds = 0.0
+
+    def update(self, distance: float, accelerationG: float, dt: float, headingDegrees: float = None) -> float:
+        """
+        :param distance: average of the left and right encoder distances (inches)
+        :param accelerationG: forward acceleration measured by the accelerometer (in G)
+        :param dt: seconds since the previous update
+        :param headingDegrees: gyro angle Z (if None, the turns are not taken into account)
+        :returns: which fraction of the wheel travel since the previous update did the robot really travel (0 to 1)
+        """
+        if self.distance is None or dt <= 0:
+            self.distance = distance
+            self.heading = headingDegrees
+            return 1.0
+        delta = distance - self.distance
+        self.distance = distance
+
+        # 1. wheel speed and acceleration from the encoders, body speed and acceleration from the accelerometer
+        # (both through the same filters: wheel acceleration is filtered twice, once as speed and once as such)
+        k = dt / (self.kFilterSeconds + dt)
+        previousWheelSpeed = self.wheelSpeed
+        self.wheelSpeed += k * (delta / dt - self.wheelSpeed)
+        self.wheelAcceleration += k * ((self.wheelSpeed - previousWheelSpeed) / dt - self.wheelAcceleration)
+        measured = accelerationG * self.kGravityInchPerSecSquared
+        if delta == 0 and abs(self.wheelSpeed) < 0.1 and not self.slipping:
+            self.bias += dt / (self.kBiasSeconds + dt) * (measured - self.bias)  # (standing still)
+        self.measuredAcceleration += k * (measured - self.bias - self.measuredAcceleration)
+        self.bodyAcceleration += k * (self.measuredAcceleration - self.bodyAcceleration)
+        self.bodySpeed += self.measuredAcceleration * dt
+        if headingDegrees is not None:
+            turn = 0.0 if self.heading is None else math.radians(math.remainder(headingDegrees - self.heading, 360))
+            self.heading = headingDegrees
+            previousYawRate = self.yawRate
+            self.yawRate += k * (turn / dt - self.yawRate)
+            self.yawAcceleration += k * ((self.yawRate - previousYawRate) / dt - self.yawAcceleration)
+
+        # 2. slipping starts when the wheels accelerate (or brake) a lot harder than the body does, for a while,
+        # and it is over when they don't anymore and their speed is back to the body speed
+        excess = (self.wheelAcceleration - self.bodyAcceleration) * math.copysign(1.0, self.wheelAcceleration)
+        suspect = excess > self.kSlipThresholdInchPerSec2 \
+            and abs(self.wheelAcceleration) > self.kSlipThresholdInchPerSec2
+        if not self.slipping:
+            self.slipSeconds = self.slipSeconds + dt if suspect else 0.0
+            if self.slipSeconds >= self.kMinSlipSeconds:
+                self.slipping = True
+                self.slipSeconds = 0.0
+                self.slipCount += 1
+                # (in a turn, one of the wheels was getting more from the floor than the body shows)
+                turnAcceleration = self.kHalfTrackWidthInch * abs(self.yawAcceleration)
+                self.slipAcceleration = abs(self.bodyAcceleration) + turnAcceleration
+        else:
+            self.slipSeconds += dt
+            regainedGrip = excess < 0.5 * self.kSlipThresholdInchPerSec2 \
+                and abs(self.wheelSpeed - self.bodySpeed) < self.kRegainedGripInchPerSec
+            if regainedGrip or self.slipSeconds > self.kMaxSlipSeconds:
+                self.slipping = False
+                self.slipSeconds = 0.0
+
+        # 3. with grip, the wheels are right about the speed (and the integrated accelerometer is not)
+        if not self.slipping:
+            if not suspect:
+                self.bodySpeed += dt / (self.kGripSeconds + dt) * (self.wheelSpeed - self.bodySpeed)
+            return 1.0
+        if abs(self.wheelSpeed) < self.kRegainedGripInchPerSec:
+            return 1.0
+        if self.kHalfTrackWidthInch * abs(self.yawRate) > abs(self.wheelSpeed):
+            return 1.0  # (pivoting: the inner wheel stands or goes back, so the average wheel speed isn't the body's)
+        return _clip(self.bodySpeed / self.wheelSpeed, 0.0, 1.0)
 
 
 class Drivetrain(commands2.Subsystem):
     kCountsPerRevolution = 585.0
     kWheelDiameterInch = 2.3622
     kMinProductiveEffort = 0.4  # control signal smaller than this might not result in XRP motor spinning
-
-    def __init__(self, maxAcceleration: float = 999) -> None:
+    kTrackWidthInch = 6.1  # distance between the left and right wheels
+    kMaxSpeedInchPerSecond = 24.0  # wheel speed at full effort (approximate, on a flat floor)
+    kMaxTractionAccelerationInchPerSec2 = 40.0  # faster than this and XRP wheels might skid
+    kMaxRampSeconds = 0.05  # (after a pause longer than this, the speed limits don't allow a bigger jump)
+    # adaptive acceleration limit (if slipControl): none until the wheels slip, then back off and slowly recover
+    kMinAdaptiveAccelerationInchPerSec2 = 15.0
+    kMaxAdaptiveAccelerationInchPerSec2 = 120.0  # (when the limit recovers up to this, it is lifted again)
+    kSlipBackoff = 0.7  # on a slip, the limit becomes this much of the acceleration at which the wheels slipped
+    kTractionRecoveryInchPerSec3 = 20.0  # while accelerating at the limit without slipping, it grows this fast
+
+    def __init__(self, maxAcceleration: float = math.inf, odometryRateHz: float = 0, maxJerk: float = math.inf,
+                 slipControl: bool = True) -> None:
+        """
+        :param maxAcceleration: how much the motor effort can change per second (for example, 4.0 = from 0 to
+          full speed in 0.25 seconds), measured from the actual time between ticks
+        :param odometryRateHz: if above zero, update the odometry this many times per second in a separate
+          thread (for example 200), instead of once per 20ms tick in periodic()
+        :param maxJerk: how much that change per second can itself change per second (smoother starts and stops)
+        :param slipControl: detect wheel slip (encoders vs accelerometer), keep the wheel spin out of the odometry,
+          and once the wheels slip, limit the acceleration to the traction of the floor (no limit before that)
+        """
         super().__init__()
         self.leftSpeed = 0
         self.rightSpeed = 0
         self.maxAcc = maxAcceleration
+        self.maxJerk = maxJerk
+        self.slipControl = slipControl
+        self.rawMode = False  # (if True, arcadeDrive sends the speeds to the motors as they are, see setRawMode)
+        # (effort per second, like maxAcc: no limit until the wheels actually slip, then it learns)
+        self.tractionLimit = math.inf
+        self.tractionTime = None
+        self.rampLimited = False  # (did the acceleration limit hold the speeds back in the latest tick)
+        self.slipEstimator = SlipEstimator()
+        self.slipCount = 0
+        # speed ramp state: the speeds and their rates of change at the end of the previous tick
+        # (all arcadeDrive calls in the same tick are limited relative to that, so the last call wins)
+        self.rampTime = None
+        self.rampSeconds = 0.0
+        self.rampLeft = self.rampRight = 0.0
+        self.rampLeftRate = self.rampRightRate = 0.0
+        self.leftRate = self.rightRate = 0.0
+        self.replayFrame = None  # (in replay mode, the recorded snapshot to use instead of the sensors)
+
+        # The devices get set up one after another, on this thread
+        # (the HAL device constructors are not safe to call from several threads at once)
+        self._initMotors()
+        self._initEncoders()
+        self._initGyro()
+        self._initSensors()
+
+        # The rangefinder and reflectance sensors are only read when somebody subscribed to them
+        # (encoders and gyro are always read, the odometry needs them)
+        self.sensors = SensorRegistry()
+        self.sensors.register("rangefinder", self._readDistanceToObstacle)
+        self.sensors.register("left-reflectance", self.reflectanceSensor.getLeftReflectanceValue)
+        self.sensors.register("right-reflectance", self.reflectanceSensor.getRightReflectanceValue)
 
+        # Set up the differential drive controller and differential drive odometry
+        # (odometry gets the encoder distances minus the wheel slip, if slipControl)
+        self.encoderLeft, self.encoderRight = self.getLeftDistanceInch(), self.getRightDistanceInch()
+        self.odometryLeft, self.odometryRight = self.encoderLeft, self.encoderRight
+        self.odometry = DifferentialDriveOdometry(
+            Rotation2d.fromDegrees(self.getGyroAngleZ()), self.odometryLeft, self.odometryRight)
+
+        # Odometry results go into a double buffer: the writer fills the back slot and then flips the index,
+        # so readers always get a complete (timestamp, pose, left, right) sample without waiting for the lock
+        self.odometryLock = threading.Lock()
+        sample = (clock.now(), self.odometry.getPose(), self.odometryLeft, self.odometryRight)
+        self.odometrySamples = [sample, sample]
+        self.odometryIndex = 0
+        self.odometryPeriod = 1.0 / odometryRateHz if odometryRateHz > 0 else 0.02
+        self.odometryRateHz = 0.0
+        self.odometryJitter = 0.0
+        self.poseHistory = PoseHistory(capacity=int(2.0 / self.odometryPeriod))  # last 2 seconds
+        self.frameSample = sample
+        self.frame = self._captureFrame(sample)
+
+        self.odometryNotifier = None
+        if odometryRateHz > 0:
+            self.odometryNotifier = wpilib.Notifier(self._updateOdometry)
+            self.odometryNotifier.setName("odometry")
+            self.odometryNotifier.startPeriodic(self.odometryPeriod)
+
+        # Dashboard values (published in one batch at the end of each tick, and only if they changed)
+        self.telemetryX = telemetry.number("x", period=0.05, deadband=0.01)
+        self.telemetryY = telemetry.number("y", period=0.05, deadband=0.01)
+        self.telemetryHeading = telemetry.number("z-heading", period=0.05, deadband=0.1)
+        self.telemetryObstacle = telemetry.number("distance-to-obst", period=0.1, deadband=0.001)
+        self.telemetryLeftReflect = telemetry.number("left-reflect", period=0.1, deadband=0.005)
+        self.telemetryRightReflect = telemetry.number("right-reflect", period=0.1, deadband=0.005)
+        # (the dashboard only needs those sensors 10 times per second, so it subscribes to them at that rate)
+        self.sensors.subscribe("rangefinder", period=0.1, callback=lambda value, t: self.telemetryObstacle.set(value))
+        self.sensors.subscribe("left-reflectance", period=0.1,
+                               callback=lambda value, t: self.telemetryLeftReflect.set(value))
+        self.sensors.subscribe("right-reflectance", period=0.1,
+                               callback=lambda value, t: self.telemetryRightReflect.set(value))
+        self.telemetryLeftEffort = telemetry.number("left-effort", period=0.1, deadband=0.01)
+        self.telemetryRightEffort = telemetry.number("right-effort", period=0.1, deadband=0.01)
+        if slipControl:
+            self.telemetryTractionLimit = telemetry.number("traction-limit", period=0.1, deadband=0.5)
+            self.telemetrySlipping = telemetry.boolean("wheel-slip", period=0.1)
+        if self.odometryNotifier is not None:
+            self.telemetryOdometryRate = telemetry.number("odometry-rate-hz", period=1.0, deadband=1.0)
+            self.telemetryOdometryJitter = telemetry.number("odometry-jitter-ms", period=1.0, deadband=0.1)
+
+    def _initMotors(self) -> None:
         # The XRP has the left and right motors set to
         # PWM channels 0 and 1 respectively
         self.leftMotor = xrp.XRPMotor(0)
         self.rightMotor = xrp.XRPMotor(1)
         self.rightMotor.setInverted(True)
 
+        # Efforts under kMinProductiveEffort get delivered by sigma-delta modulation, separately for each motor
+        self.leftModulator = SigmaDeltaModulator(self.kMinProductiveEffort)
+        self.rightModulator = SigmaDeltaModulator(self.kMinProductiveEffort)
+
+    def _initEncoders(self) -> None:
         # The XRP has onboard encoders that are hardcoded
         # to use DIO pins 4/5 and 6/7 for the left and right
         self.leftEncoder = wpilib.Encoder(4, 5)
         self.rightEncoder = wpilib.Encoder(6, 7)
 
-        # And an onboard gyro (and you have to power on your XRP when it is on flat surface)
-        self.gyro = xrp.XRPGyro()
-        self.accelerometer = wpilib.BuiltInAccelerometer()
-        self.reflectanceSensor = xrp.XRPReflectanceSensor()
-        self.distanceSensor = xrp.XRPRangefinder()
-
         # Use inches as unit for encoder distances
         self.leftEncoder.setDistancePerPulse(
             (math.pi * self.kWheelDiameterInch) / self.kCountsPerRevolution
@@ -51,21 +380,148 @@ class Drivetrain(commands2.Subsystem):
             (math.pi * self.kWheelDiameterInch) / self.kCountsPerRevolution
         )
         self.resetEncoders()
+
+    def _initGyro(self) -> None:
+        # And an onboard gyro (and you have to power on your XRP when it is on flat surface)
+        self.gyro = xrp.XRPGyro()
         self.resetGyro()
 
-        # Set up the differential drive controller and differential drive odometry
-        self.odometry = DifferentialDriveOdometry(
-            Rotation2d.fromDegrees(self.getGyroAngleZ()), self.getLeftDistanceInch(), self.getRightDistanceInch())
+    def _initSensors(self) -> None:
+        self.accelerometer = wpilib.BuiltInAccelerometer()
+        self.reflectanceSensor = xrp.XRPReflectanceSensor()
+        self.distanceSensor = xrp.XRPRangefinder()
 
     def periodic(self) -> None:
-        heading = Rotation2d.fromDegrees(self.getGyroAngleZ())
-        pose = self.odometry.update(heading, self.getLeftDistanceInch(), self.getRightDistanceInch())
-        SmartDashboard.putNumber("distance-to-obst", self.getDistanceToObstacle())
-        SmartDashboard.putNumber("left-reflect", self.reflectanceSensor.getLeftReflectanceValue())
-        SmartDashboard.putNumber("right-reflect", self.reflectanceSensor.getRightReflectanceValue())
-        SmartDashboard.putNumber("x", pose.x)
-        SmartDashboard.putNumber("y", pose.y)
-        SmartDashboard.putNumber("z-heading", pose.rotation().degrees())
+        # 1. read the sensors only once per tick and update the odometry (unless a separate thread does that)
+        if self.replayFrame is not None:
+            frame = self.replayFrame
+        else:
+            if self.odometryNotifier is None:
+                self._updateOdometry()
+            else:
+                self.telemetryOdometryRate.set(self.odometryRateHz)
+                self.telemetryOdometryJitter.set(self.odometryJitter * 1000)
+            self.sensors.poll(clock.now())  # (only the subscribed sensors which are due)
+            frame = self._captureFrame(self.odometrySamples[self.odometryIndex])
+        self.frameSample = self.odometrySamples[self.odometryIndex]
+        self.frame = frame
+
+        # 2. adapt the acceleration limit to how much traction the wheels have
+        if self.slipControl:
+            self._adaptTractionLimit(frame.timestamp)
+
+        # 3. publish the same snapshot which all the commands will be seeing
+        self.telemetryX.set(frame.x)
+        self.telemetryY.set(frame.y)
+        self.telemetryHeading.set(frame.headingDegrees)
+        self.telemetryLeftEffort.set(self.leftModulator.average)
+        self.telemetryRightEffort.set(self.rightModulator.average)
+
+    def getFrame(self) -> SensorFrame:
+        """The sensor snapshot from the latest tick (commands should read this, instead of calling the getters)"""
+        sample = self.odometrySamples[self.odometryIndex]
+        if sample is not self.frameSample:
+            # the odometry thread has a fresher pose than this tick's snapshot
+            _, pose, left, right = sample
+            self.frame = self.frame.withPose(pose, left, right)
+            self.frameSample = sample
+        return self.frame
+
+    def setReplayFrame(self, frame: SensorFrame, encoderDistance: float = None, accelerationG: float = None,
+                       gyroAngleZ: float = None) -> None:
+        """
+        Replay mode: from now on use this (recorded) snapshot instead of reading the sensors,
+        until the next call (and setReplayFrame(None) goes back to the real sensors)
+
+        :param encoderDistance: average of the raw left and right encoder distances when the snapshot was recorded
+        :param accelerationG: forward acceleration at that time (with these two, the slip estimator runs as it did)
+        :param gyroAngleZ: gyro angle at that time, in degrees (and with this, it also sees the turns)
+        """
+        previous = self.replayFrame
+        self.replayFrame = frame
+        if frame is not None:
+            self.frame = frame
+            self.frameSample = self.odometrySamples[self.odometryIndex]
+            if self.slipControl and encoderDistance is not None:
+                dt = frame.timestamp - previous.timestamp if previous is not None else 0.0
+                self.slipEstimator.update(encoderDistance, accelerationG, dt, gyroAngleZ)
+
+    def _adaptTractionLimit(self, now: float) -> None:
+        dt = now - self.tractionTime if self.tractionTime is not None else 0.0
+        self.tractionTime = now
+        slipCount = self.slipEstimator.slipCount
+        if slipCount != self.slipCount:
+            # the wheels slipped (since the previous tick): back off, below what the floor just managed to give
+            self.slipCount = slipCount
+            minimum = self.kMinAdaptiveAccelerationInchPerSec2 / self.kMaxSpeedInchPerSecond
+            traction = self.slipEstimator.slipAcceleration / self.kMaxSpeedInchPerSecond
+            self.tractionLimit = max(minimum, min(self.tractionLimit, traction) * self.kSlipBackoff)
+        elif self.rampLimited and not self.slipEstimator.slipping and self.tractionLimit != math.inf:
+            # accelerating as fast as allowed, and the wheels hold: try a little faster
+            maximum = self.kMaxAdaptiveAccelerationInchPerSec2 / self.kMaxSpeedInchPerSecond
+            recovery = self.kTractionRecoveryInchPerSec3 / self.kMaxSpeedInchPerSecond
+            self.tractionLimit += recovery * min(dt, self.kMaxRampSeconds)
+            if self.tractionLimit >= maximum:
+                self.tractionLimit = math.inf  # (the floor is good enough, no limit)
+        self.telemetryTractionLimit.set(self.tractionLimit * self.kMaxSpeedInchPerSecond)
+        self.telemetrySlipping.set(self.slipEstimator.slipping)
+
+    def isSlipping(self) -> bool:
+        """Are the wheels slipping now (see SlipEstimator)"""
+        return self.slipEstimator.slipping
+
+    def getOdometryRateHz(self) -> float:
+        """How many times per second the odometry actually gets updated (measured)"""
+        return self.odometryRateHz
+
+    def getOdometryJitterMs(self) -> float:
+        """Average deviation of the odometry update period from the requested one, in milliseconds"""
+        return self.odometryJitter * 1000
+
+    def _updateOdometry(self) -> None:
+        # (runs in the odometry notifier thread, if there is one, otherwise in periodic)
+        with self.odometryLock:
+            # (sensors are read under the lock, so that resetOdometry cannot happen between reading and using them)
+            encoderLeft, encoderRight = self.getLeftDistanceInch(), self.getRightDistanceInch()
+            heading = Rotation2d.fromDegrees(self.getGyroAngleZ())
+            now = clock.read()  # (not the tick time: in the odometry thread, this runs between the ticks)
+            previous = self.odometrySamples[self.odometryIndex][0]
+
+            # (while the wheels slip, only the part of their travel which the robot really made goes into odometry)
+            fraction = 1.0
+            if self.slipControl:
+                fraction = self.slipEstimator.update(
+                    0.5 * (encoderLeft + encoderRight), self.getAccelX(), now - previous, heading.degrees())
+            self.odometryLeft += (encoderLeft - self.encoderLeft) * fraction
+            self.odometryRight += (encoderRight - self.encoderRight) * fraction
+            self.encoderLeft, self.encoderRight = encoderLeft, encoderRight
+            left, right = self.odometryLeft, self.odometryRight
+
+            pose = self.odometry.update(heading, left, right)
+            back = 1 - self.odometryIndex
+            self.odometrySamples[back] = (now, pose, left, right)
+            self.odometryIndex = back
+            self.poseHistory.add(now, pose.x, pose.y, pose.rotation().degrees())
+
+        # measure the actual update rate and jitter (exponential moving averages)
+        interval = now - previous
+        if interval > 0:
+            self.odometryRateHz += 0.05 * (1.0 / interval - self.odometryRateHz)
+            self.odometryJitter += 0.05 * (abs(interval - self.odometryPeriod) - self.odometryJitter)
+
+    def _captureFrame(self, sample) -> SensorFrame:
+        _, pose, left, right = sample
+        return SensorFrame(
+            clock.now(),
+            pose,
+            left,
+            right,
+            self.getGyroVelocityZ(),
+            math.nan,  # (rangefinder and reflectance: read when asked for, see self.sensors)
+            math.nan,
+            math.nan,
+            self.sensors,
+        )
 
 
     def arcadeDrive(self, fwd: float, rot: float, square: bool = False) -> None:
@@ -82,14 +538,88 @@ class Drivetrain(commands2.Subsystem):
             fwd = fwd * abs(fwd)
         desiredLeftSpeed, desiredRightSpeed = _to_left_right_speeds(fwd, rot)
 
-        # 2. adjust the desired wheel speeds for allowed max acceleration (to avoid skidding on the floor)
-        self.leftSpeed = _clip(desiredLeftSpeed, self.leftSpeed - self.maxAcc, self.leftSpeed + self.maxAcc)
-        self.rightSpeed = _clip(desiredRightSpeed, self.rightSpeed - self.maxAcc, self.rightSpeed + self.maxAcc)
+        # 2. adjust the desired wheel speeds for allowed max acceleration and jerk (to avoid skidding on the floor),
+        # per second of the actual time since the previous tick
+        now = clock.now()
+        sameTick = now == self.rampTime
+        if not sameTick:
+            # (first call in this tick: the speeds where the previous tick ended are what we ramp from)
+            self.rampSeconds = min(now - self.rampTime, self.kMaxRampSeconds) if self.rampTime is not None else 0.02
+            self.rampTime = now
+            self.rampLeft, self.rampRight = self.leftSpeed, self.rightSpeed
+            self.rampLeftRate, self.rampRightRate = self.leftRate, self.rightRate
+        if self.rawMode or (self.maxAcc == math.inf and self.maxJerk == math.inf):
+            self.leftSpeed, self.rightSpeed = desiredLeftSpeed, desiredRightSpeed  # (no limits)
+            self.leftRate = self.rightRate = 0.0
+        else:
+            self.leftSpeed, self.leftRate = _slew(
+                desiredLeftSpeed, self.rampLeft, self.rampLeftRate, self.rampSeconds, self.maxAcc, self.maxJerk)
+            self.rightSpeed, self.rightRate = _slew(
+                desiredRightSpeed, self.rampRight, self.rampRightRate, self.rampSeconds, self.maxAcc, self.maxJerk)
+        if self.tractionLimit != math.inf and not self.rawMode and self.rampSeconds > 0:
+            # the traction limit is only for speeding up and slowing down, both wheels shift by the same amount
+            # (limiting how fast the steering changes too would make the robot lag behind in the turns and miss them)
+            rampSpeed = 0.5 * (self.rampLeft + self.rampRight)
+            speed = 0.5 * (self.leftSpeed + self.rightSpeed)
+            maxChange = self.tractionLimit * self.rampSeconds
+            shift = _clip(speed - rampSpeed, -maxChange, maxChange) - (speed - rampSpeed)
+            if shift != 0:
+                self.leftSpeed = _clip(self.leftSpeed + shift, -1.0, 1.0)
+                self.rightSpeed = _clip(self.rightSpeed + shift, -1.0, 1.0)
+                self.leftRate = (self.leftSpeed - self.rampLeft) / self.rampSeconds
+                self.rightRate = (self.rightSpeed - self.rampRight) / self.rampSeconds
+        self.rampLimited = self.leftSpeed != desiredLeftSpeed or self.rightSpeed != desiredRightSpeed
+
+        # 3. set the motors to proceed with those speeds (modulating those which are too small for the motor,
+        # one modulation step per tick: a repeated call in the same tick replaces the step of the earlier one)
+        if self.rawMode:
+            self.leftMotor.set(self.leftModulator.bypass(self.leftSpeed, sameTick))
+            self.rightMotor.set(self.rightModulator.bypass(self.rightSpeed, sameTick))
+        else:
+            self.leftMotor.set(self.leftModulator.modulate(self.leftSpeed, sameTick))
+            self.rightMotor.set(self.rightModulator.modulate(self.rightSpeed, sameTick))
+
+    def getLeftEffectiveOutput(self) -> float:
+        """The effort which the left motor actually gets on average (after the sigma-delta modulation)"""
+        return self.leftModulator.average
+
+    def getRightEffectiveOutput(self) -> float:
+        """The effort which the right motor actually gets on average (after the sigma-delta modulation)"""
+        return self.rightModulator.average
+
+    def getMaxAccelerationInchPerSecSquared(self) -> float:
+        """
+        The acceleration limit in inches per second squared (maxAcc is in effort per second),
+        or the traction limit learned from wheel slip, if that is lower
+        """
+        return min(self.maxAcc, self.tractionLimit) * self.kMaxSpeedInchPerSecond
 
-        # 3. set the motors to proceed with those speeds
-        t = Timer.getFPGATimestamp()
-        self.leftMotor.set(_protect_from_min_motor_speed(self.leftSpeed, t))
-        self.rightMotor.set(_protect_from_min_motor_speed(self.rightSpeed, t))
+    def setAccelerationLimits(self, maxAcceleration: float = math.inf, maxJerk: float = math.inf) -> None:
+        """
+        :param maxAcceleration: how much the motor effort can change per second
+        :param maxJerk: how much that change per second can itself change per second
+        """
+        self.maxAcc = maxAcceleration
+        self.maxJerk = maxJerk
+
+    def setRawMode(self, enabled: bool) -> None:
+        """
+        Raw mode: arcadeDrive sends the wheel speeds to the motors as they are, without the acceleration, jerk and
+        traction limits and without the sigma-delta modulation (for measuring how the motors themselves respond)
+        """
+        self.rawMode = enabled
+
+    def makeProfile(self, distanceInch: float, speed: float = 1.0) -> TrapezoidProfile:
+        """
+        A trapezoidal velocity profile (in inches and seconds) for driving this distance, with the max acceleration
+        which is safe for the wheels (learned, if slipControl) and allowed by maxAcc
+
+        :param speed: cruising speed, as effort between 0.0 and 1.0
+        """
+        maxAcceleration = self.getMaxAccelerationInchPerSecSquared()
+        if self.tractionLimit == math.inf:
+            maxAcceleration = min(self.kMaxTractionAccelerationInchPerSec2, maxAcceleration)  # (nothing learned)
+        return TrapezoidProfile(distanceInch, abs(speed) * self.kMaxSpeedInchPerSecond, maxAcceleration)
 
     def stop(self) -> None:
         """
@@ -97,8 +627,29 @@ class Drivetrain(commands2.Subsystem):
         """
         self.leftSpeed = 0
         self.rightSpeed = 0
+        self.leftRate = self.rightRate = 0.0
+        self.rampTime = None
+        self.leftModulator.reset()
+        self.rightModulator.reset()
         self.arcadeDrive(0, 0)
 
+    def resetState(self) -> None:
+        """
+        Stop, and forget the state which the earlier driving left behind (the learned traction limit, wheel slip,
+        speed ramp and modulators), like a newly created drivetrain: for example, before replaying another log
+        """
+        with self.odometryLock:
+            self.slipEstimator = SlipEstimator()
+            self.slipCount = 0
+        self.tractionLimit = math.inf
+        self.tractionTime = None
+        self.rampLimited = False
+        self.stop()
+        self.rampTime = None
+        self.rampSeconds = 0.0
+        self.rampLeft = self.rampRight = 0.0
+        self.rampLeftRate = self.rampRightRate = 0.0
+
     def resetEncoders(self) -> None:
         """Resets the drive encoders to currently read a position of 0."""
         self.leftEncoder.reset()
@@ -144,41 +695,62 @@ class Drivetrain(commands2.Subsystem):
     def getGyroVelocityZ(self) -> float:
         """The angular velocity in the Z-axis.
 
-        :returns: The acceleration of the XRP along the Z-axis in Gs
+        :returns: The angular velocity of the XRP around the Z-axis in degrees per second
         """
-        return self.gyro.getRateZ()
+        if self.replayFrame is not None:
+            return self.replayFrame.gyroRateZ
+        return math.degrees(self.gyro.getRateZ())  # (XRPGyro gives radians)
 
     def getGyroAngleX(self) -> float:
         """Current angle of the XRP around the X-axis.
 
         :returns: The current angle of the XRP in degrees
         """
-        return self.gyro.getAngleX()
+        return math.degrees(self.gyro.getAngleX())
 
     def getGyroAngleY(self) -> float:
         """Current angle of the XRP around the Y-axis.
 
         :returns: The current angle of the XRP in degrees
         """
-        return self.gyro.getAngleY()
+        return math.degrees(self.gyro.getAngleY())
 
     def getGyroAngleZ(self) -> float:
         """Current angle of the XRP around the Z-axis.
 
         :returns: The current angle of the XRP in degrees
         """
-        return self.gyro.getAngleZ()
+        return math.degrees(self.gyro.getAngleZ())
 
     def getDistanceToObstacle(self) -> float:
         """Distance to obstacle in the front, as given by the distance sensor
 
         :returns: Distance in meters, values >0.5 are not very reliable and are replaced with nan.
         """
+        if self.replayFrame is not None:
+            return self.replayFrame.distanceToObstacle
+        return self.sensors.value("rangefinder")  # (not read again, if it was already read in this tick)
+
+    def _readDistanceToObstacle(self) -> float:
         distance = self.distanceSensor.getDistance()
         return distance if distance < 0.5 else math.nan
 
     def getPose(self) -> Pose2d:
-        return self.odometry.getPose()
+        if self.replayFrame is not None:
+            return self.frame.pose
+        return self.odometrySamples[self.odometryIndex][1]
+
+    def getPoseAt(self, timestamp: float) -> Pose2d:
+        """Where the robot was at that FPGA timestamp (interpolated, for aligning sensor readings with odometry)
+
+        :returns: the pose, or None if the odometry history is empty
+        """
+        with self.odometryLock:
+            sample = self.poseHistory.lookup(timestamp)
+        if sample is None:
+            return None
+        x, y, headingDegrees = sample
+        return Pose2d(x, y, Rotation2d.fromDegrees(headingDegrees))
 
     def getLocation(self) -> Translation2d:
         return self.getPose().translation()
@@ -191,10 +763,26 @@ class Drivetrain(commands2.Subsystem):
         self.gyro.reset()
 
     def resetOdometry(self, pose: Pose2d = Pose2d()) -> None:
-        self.resetGyro()
-        self.resetEncoders()
-        heading = Rotation2d.fromDegrees(self.getGyroAngleZ())
-        self.odometry.resetPosition(heading, self.getLeftDistanceInch(), self.getRightDistanceInch(), pose)
+        with self.odometryLock:
+            self.resetGyro()
+            self.resetEncoders()
+            heading = Rotation2d.fromDegrees(self.getGyroAngleZ())
+            left, right = self.getLeftDistanceInch(), self.getRightDistanceInch()
+            self.encoderLeft, self.encoderRight = self.odometryLeft, self.odometryRight = left, right
+            self.slipEstimator.reset(0.5 * (left + right))
+            self.odometry.resetPosition(heading, left, right, pose)
+            self.poseHistory.clear()  # (older poses were in different coordinates)
+            back = 1 - self.odometryIndex
+            self.odometrySamples[back] = (clock.now(), self.odometry.getPose(), left, right)
+            self.odometryIndex = back
+        # (commands scheduled right after the reset in the same tick must not see the old pose)
+        sample = self.odometrySamples[self.odometryIndex]
+        if self.replayFrame is not None:
+            _, pose, left, right = sample
+            self.frame = self.frame.withPose(pose, left, right)
+        else:
+            self.frame = self._captureFrame(sample)
+        self.frameSample = sample
 
     def resetPose(self, pose: Pose2d = Pose2d()) -> None:
         self.resetOdometry(pose)
@@ -206,19 +794,24 @@ def _clip(x, minimum, maximum):
         x = minimum
     return x
 
-def _protect_from_min_motor_speed(speed, t, min_motor_speed=Drivetrain.kMinProductiveEffort, period_seconds=0.5):
-    # 1. if speed is zero or above min_motor_speed, just use that
-    if speed == 0 or abs(speed) > min_motor_speed:
-        return speed
-    # 2. if speed is smaller than min_motor_speed, do something else:
-    #  - use +-min_motor_speed but only a certain % of the time
-    #  - and use zero speed otherwise
-    probability = t / period_seconds
-    probability = probability - int(probability)  # floating point number between 0.0 and 0.999999
-    if min_motor_speed * probability < abs(speed):
-        return math.copysign(min_motor_speed, speed)
-    else:
-        return 0
+def _slew(desired, speed, rate, seconds, maxRate, maxRateChange):
+    """
+    :returns: (new speed, its rate of change) going from speed towards desired in that many seconds,
+      changing by at most maxRate per second, and that rate changing by at most maxRateChange per second
+    """
+    if seconds <= 0:
+        return speed, rate
+    error = desired - speed
+    wantedRate = _clip(error / seconds, -maxRate, maxRate)
+    if maxRateChange != math.inf:
+        # slow the rate down early enough to arrive without overshooting, and change it at most by maxRateChange
+        brakingRate = math.sqrt(2.0 * maxRateChange * abs(error))
+        wantedRate = _clip(wantedRate, -brakingRate, brakingRate)
+        wantedRate = _clip(wantedRate, rate - maxRateChange * seconds, rate + maxRateChange * seconds)
+    newSpeed = speed + wantedRate * seconds
+    if (desired - newSpeed) * error < 0:
+        newSpeed, wantedRate = desired, error / seconds  # (don't overshoot)
+    return newSpeed, wantedRate
 
 def _to_left_right_speeds(fwd, rot):
     rot = _clip(rot, -1.0, +1.0)
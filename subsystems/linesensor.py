@@ -0,0 +1,159 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+from array import array
+
+import commands2
+
+from utils.log import getLogger
+from utils.telemetry import telemetry
+
+log = getLogger(__name__)
+
+
+class LineSensorConstants:
+    kLookupSize = 256  # raw reflectance (0.0 to 1.0) is normalized through a table with this many steps
+    kFilterLength = 3  # moving average of this many ticks (longer = smoother, but reacts later)
+    kMinLineSignal = 0.2  # if the two normalized readings add up to less than this, we don't see the line
+    kMinCalibrationRange = 0.1  # a calibration sweep with less contrast than this probably never saw the line
+
+
+class LineSensor(commands2.Subsystem):
+    """
+    Processes the two reflectance readings of the drivetrain snapshot, once per tick:
+    normalize with the calibration lookup table (0 = floor, 1 = line), smooth with a moving average,
+    and estimate where the line is (see getLinePosition)
+    """
+
+    def __init__(self, drivetrain) -> None:
+        super().__init__()
+        self.drivetrain = drivetrain
+        self.calibrating = False
+        self.calibrated = False
+        self.minimum = [1.0, 1.0]  # (left, right) seen during the calibration sweep
+        self.maximum = [0.0, 0.0]
+        self.leftLookup = self.rightLookup = _lookupTable(0.0, 1.0)  # before calibration, just the raw values
+
+        # ring buffers for the moving average, with the running sums
+        self.leftHistory = array("d", [0.0] * LineSensorConstants.kFilterLength)
+        self.rightHistory = array("d", [0.0] * LineSensorConstants.kFilterLength)
+        self.historyIndex = 0
+        self.leftSum = 0.0
+        self.rightSum = 0.0
+
+        self.left = 0.0
+        self.right = 0.0
+        self.linePosition = 0.0
+        self.lineVisible = False
+        self.lastFrame = None
+        self.users = 0  # how many commands need the line sensor now (it only reads the sensors if any)
+        self.subscriptions = []
+
+        self.telemetryLinePosition = telemetry.number("line-position", period=0.05, deadband=0.01)
+
+    def activate(self) -> None:
+        """Start reading the reflectance sensors every tick (commands using the line sensor call this first)"""
+        self.users += 1
+        if self.users == 1:
+            self.subscriptions = [self.drivetrain.sensors.subscribe("left-reflectance"),
+                                  self.drivetrain.sensors.subscribe("right-reflectance")]
+
+    def deactivate(self) -> None:
+        """Commands using the line sensor call this when they end"""
+        self.users -= 1
+        if self.users == 0:
+            for subscription in self.subscriptions:
+                subscription.cancel()
+            self.subscriptions = []
+
+    def periodic(self) -> None:
+        if self.users == 0:
+            return
+        frame = self.drivetrain.getFrame()
+        if frame is self.lastFrame:
+            return
+        self.lastFrame = frame
+        rawLeft, rawRight = frame.leftReflectance, frame.rightReflectance
+
+        # 1. during a calibration sweep, remember the darkest and the brightest readings
+        if self.calibrating:
+            minimum, maximum = self.minimum, self.maximum
+            if rawLeft < minimum[0]: minimum[0] = rawLeft
+            if rawLeft > maximum[0]: maximum[0] = rawLeft
+            if rawRight < minimum[1]: minimum[1] = rawRight
+            if rawRight > maximum[1]: maximum[1] = rawRight
+
+        # 2. normalize by table lookup, and smooth with the moving average (subtract the oldest, add the newest)
+        scale = LineSensorConstants.kLookupSize - 1
+        left = self.leftLookup[int(min(max(rawLeft, 0.0), 1.0) * scale)]
+        right = self.rightLookup[int(min(max(rawRight, 0.0), 1.0) * scale)]
+        index = self.historyIndex
+        self.leftSum += left - self.leftHistory[index]
+        self.rightSum += right - self.rightHistory[index]
+        self.leftHistory[index] = left
+        self.rightHistory[index] = right
+        self.historyIndex = (index + 1) % LineSensorConstants.kFilterLength
+        left = self.left = self.leftSum / LineSensorConstants.kFilterLength
+        right = self.right = self.rightSum / LineSensorConstants.kFilterLength
+
+        # 3. where is the line? (if we lost it, it is probably still on the side where we saw it last)
+        total = left + right
+        self.lineVisible = total >= LineSensorConstants.kMinLineSignal
+        if self.lineVisible:
+            self.linePosition = (left - right) / total
+        elif self.linePosition != 0.0:
+            self.linePosition = 1.0 if self.linePosition > 0 else -1.0
+        self.telemetryLinePosition.set(self.linePosition)
+
+    def getLinePosition(self) -> float:
+        """
+        :returns: between -1.0 (line is under the right sensor) and +1.0 (under the left sensor),
+          0.0 = right in the middle (after the line was lost: -1.0 or +1.0, on the side where it was seen last)
+        """
+        return self.linePosition
+
+    def isLineVisible(self) -> bool:
+        return self.lineVisible
+
+    def getLeft(self) -> float:
+        """:returns: normalized and smoothed left reflectance (0.0 = floor, 1.0 = line)"""
+        return self.left
+
+    def getRight(self) -> float:
+        return self.right
+
+    def isCalibrated(self) -> bool:
+        return self.calibrated
+
+    def startCalibration(self) -> None:
+        """Start remembering the min and max readings (then sweep both sensors over the line and the floor)"""
+        self.minimum = [1.0, 1.0]
+        self.maximum = [0.0, 0.0]
+        self.calibrating = True
+        self.activate()
+
+    def stopCalibration(self) -> None:
+        """Stop the sweep and make the lookup tables from the min and max readings seen during it"""
+        if not self.calibrating:
+            return
+        self.calibrating = False
+        self.deactivate()
+        (leftMin, rightMin), (leftMax, rightMax) = self.minimum, self.maximum
+        if min(leftMax - leftMin, rightMax - rightMin) < LineSensorConstants.kMinCalibrationRange:
+            log.warning("line sensor calibration failed (did the sensors see the line?), min=%s max=%s",
+                        self.minimum, self.maximum)
+            return
+        self.leftLookup = _lookupTable(leftMin, leftMax)
+        self.rightLookup = _lookupTable(rightMin, rightMax)
+        self.calibrated = True
+        log.info("line sensor calibrated, min=%s max=%s", self.minimum, self.maximum)
+
+
+def _lookupTable(minimum: float, maximum: float) -> array:
+    """:returns: table of (raw - minimum) / (maximum - minimum), clipped to 0..1, for raw from 0.0 to 1.0"""
+    scale = LineSensorConstants.kLookupSize - 1
+    span = max(maximum - minimum, 1e-6)
+    return array("d", [min(max((i / scale - minimum) / span, 0.0), 1.0) for i in range(scale + 1)])
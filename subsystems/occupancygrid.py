@@ -0,0 +1,224 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+import math
+
+import commands2
+
+from utils.telemetry import telemetry
+
+np = None  # numpy, imported when the map is first needed (RobotContainer always makes a grid, most runs never map)
+
+
+class OccupancyGridConstants:
+    kCellInch = 1.0
+    kRangefinderOffsetInch = 3.0  # the rangefinder is this far in front of the robot center
+    kMaxRangeInch = 0.5 / 0.0254  # the drivetrain reports nan beyond 0.5 meters (= nothing closer than that)
+    kLogOddsHit = 0.85  # how much more sure we get that a cell is occupied, when the beam ends there
+    kLogOddsMiss = -0.4  # ... and that it's free, when the beam passes through
+    kLogOddsLimit = 4.0  # (so one cell can change its mind after a few readings)
+    kLogOddsOccupied = 1.5  # cells above this count as obstacles
+    kClearanceInch = 4.0  # the robot is about 6 inches wide (plus a little margin)
+
+
+class OccupancyGrid(commands2.Subsystem):
+    """
+    A map of obstacles seen by the rangefinder: every tick, the cells along the rangefinder beam
+    (from the current pose) become more likely free, and the cell where the beam ends becomes more likely occupied.
+    Only the few cells along the beam are touched per tick, and the occupied cells are also kept in a list,
+    so the queries below are fast enough to run every tick.
+    The map only gets updated while some command uses it (see activate()), the rangefinder is not read otherwise
+    (and until then the map isn't even allocated).
+    """
+
+    def __init__(self, drivetrain, xmin: float = -60, ymin: float = -60, xmax: float = 60, ymax: float = 60,
+                 cellInch: float = OccupancyGridConstants.kCellInch) -> None:
+        """
+        :param drivetrain: where the poses and rangefinder readings come from
+        :param xmin, ymin, xmax, ymax: the mapped area in inches (the odometry starts at 0, 0)
+        :param cellInch: size of one grid cell
+        """
+        super().__init__()
+        self.drivetrain = drivetrain
+        self.xmin = xmin
+        self.ymin = ymin
+        self.cellInch = cellInch
+        self.columns = int(math.ceil((xmax - xmin) / cellInch))
+        self.rows = int(math.ceil((ymax - ymin) / cellInch))
+        self.logOdds = None  # (rows x columns, allocated on first use, see _allocate)
+        self.occupiedCells = set()  # (row, column) of cells above kLogOddsOccupied
+        self.occupiedXY = ()  # centers of those cells, in inches (rebuilt only when they change)
+        self.occupiedChanged = False
+        self.beamSteps = None  # beam sample offsets (every half cell, up to the max range), made once
+        self.lastFrame = None
+        self.users = 0  # how many commands are using the grid now
+        self.subscription = None
+
+        self.telemetryOccupied = telemetry.number("occupied-cells", period=0.5)
+
+    def activate(self) -> None:
+        """Start reading the rangefinder every tick and mapping (commands using the grid call this first)"""
+        self.users += 1
+        if self.users == 1:
+            self._allocate()
+            self.subscription = self.drivetrain.sensors.subscribe("rangefinder")
+
+    def deactivate(self) -> None:
+        """Commands using the grid call this when they end (the map is kept, but not updated anymore)"""
+        self.users -= 1
+        if self.users == 0:
+            self.subscription.cancel()
+            self.subscription = None
+
+    def periodic(self) -> None:
+        if self.users == 0:
+            return
+        frame = self.drivetrain.getFrame()
+        if frame is self.lastFrame:
+            return  # (no new reading)
+        self.lastFrame = frame
+        self.addReading(frame.x, frame.y, frame.headingDegrees, frame.distanceToObstacle)
+        self.telemetryOccupied.set(len(self.occupiedCells))
+
+    def clear(self) -> None:
+        """Forget everything (for example after the odometry was reset, since the old map is in old coordinates)"""
+        if self.logOdds is not None:
+            self.logOdds.fill(0.0)
+        self.occupiedCells.clear()
+        self.occupiedXY = ()
+        self.occupiedChanged = False
+
+    def addReading(self, x: float, y: float, headingDegrees: float, distanceMeters: float) -> None:
+        """
+        Ray-cast one rangefinder reading into the grid
+
+        :param x, y, headingDegrees: robot pose (inches)
+        :param distanceMeters: rangefinder reading, nan = nothing within the max range
+        """
+        self._allocate()
+
+        # 1. where does the beam start, and how far does it go?
+        c, s = math.cos(math.radians(headingDegrees)), math.sin(math.radians(headingDegrees))
+        x0 = x + c * OccupancyGridConstants.kRangefinderOffsetInch
+        y0 = y + s * OccupancyGridConstants.kRangefinderOffsetInch
+        hit = distanceMeters == distanceMeters  # (not nan)
+        length = distanceMeters / 0.0254 if hit else OccupancyGridConstants.kMaxRangeInch
+
+        # 2. cells which the beam passed through (before the hit cell) are more likely free
+        steps = self.beamSteps[:np.searchsorted(self.beamSteps, length - 0.5 * self.cellInch)]
+        rows, columns, inside = self._cells(y0 + s * steps, x0 + c * steps)
+        if hit:
+            # (the last half cell before the hit can still be in the hit cell: that one is not free)
+            hitRow = int((y0 + s * length - self.ymin) // self.cellInch)
+            hitColumn = int((x0 + c * length - self.xmin) // self.cellInch)
+            inside &= (rows != hitRow) | (columns != hitColumn)
+        if inside.any():
+            rows, columns = rows[inside], columns[inside]
+            logOdds = self.logOdds
+            logOdds[rows, columns] = np.maximum(
+                logOdds[rows, columns] + OccupancyGridConstants.kLogOddsMiss, -OccupancyGridConstants.kLogOddsLimit)
+            if self.occupiedCells:
+                for cell in zip(rows.tolist(), columns.tolist()):
+                    if cell in self.occupiedCells and logOdds[cell] <= OccupancyGridConstants.kLogOddsOccupied:
+                        self.occupiedCells.discard(cell)
+                        self.occupiedChanged = True
+
+        # 3. and the cell where the beam ended is more likely occupied
+        if hit:
+            row, column = hitRow, hitColumn
+            if 0 <= row < self.rows and 0 <= column < self.columns:
+                value = min(self.logOdds[row, column] + OccupancyGridConstants.kLogOddsHit,
+                            OccupancyGridConstants.kLogOddsLimit)
+                self.logOdds[row, column] = value
+                if value > OccupancyGridConstants.kLogOddsOccupied and (row, column) not in self.occupiedCells:
+                    self.occupiedCells.add((row, column))
+                    self.occupiedChanged = True
+
+    def isOccupied(self, x: float, y: float) -> bool:
+        if self.logOdds is None:
+            return False
+        row = int((y - self.ymin) // self.cellInch)
+        column = int((x - self.xmin) // self.cellInch)
+        if 0 <= row < self.rows and 0 <= column < self.columns:
+            return bool(self.logOdds[row, column] > OccupancyGridConstants.kLogOddsOccupied)
+        return False
+
+    def isSegmentClear(self, x0: float, y0: float, x1: float, y1: float,
+                       clearanceInch: float = OccupancyGridConstants.kClearanceInch) -> bool:
+        """
+        :returns: True if no known obstacle is closer than clearanceInch to the segment from (x0, y0) to (x1, y1)
+        """
+        points = self._occupiedPoints()
+        if len(points) == 0:
+            return True
+        return bool(_segmentDistances(points, x0, y0, x1, y1).min() >= clearanceInch)
+
+    def clearanceAlong(self, x0: float, y0: float, x1: float, y1: float,
+                       clearanceInch: float = OccupancyGridConstants.kClearanceInch) -> float:
+        """
+        :returns: how far the robot can go from (x0, y0) towards (x1, y1) before some known obstacle gets closer
+          than clearanceInch to it (math.inf, if it can go all the way without that)
+        """
+        points = self._occupiedPoints()
+        if len(points) == 0:
+            return math.inf
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy)
+        if length == 0:
+            return math.inf
+        px, py = points[:, 0] - x0, points[:, 1] - y0
+        along = (px * dx + py * dy) / length  # (how far ahead on the way each obstacle is, and how far to the side)
+        aside = np.abs(px * dy - py * dx) / length
+        inTheWay = (aside < clearanceInch) & (along >= 0) & (along <= length + clearanceInch)
+        if not inTheWay.any():
+            return math.inf
+        # (the robot gets too close when its center is this much before the point alongside the obstacle)
+        reach = along[inTheWay] - np.sqrt(clearanceInch ** 2 - aside[inTheWay] ** 2)
+        return max(0.0, float(reach.min()))
+
+    def nearestObstacle(self, x: float, y: float):
+        """:returns: (x, y, distance) of the known obstacle nearest to this point, or None if none known"""
+        points = self._occupiedPoints()
+        if len(points) == 0:
+            return None
+        distances = np.hypot(points[:, 0] - x, points[:, 1] - y)
+        nearest = int(distances.argmin())
+        return float(points[nearest, 0]), float(points[nearest, 1]), float(distances[nearest])
+
+    def _allocate(self) -> None:
+        global np
+        if self.logOdds is not None:
+            return
+        if np is None:
+            import numpy
+            np = numpy
+        self.logOdds = np.zeros((self.rows, self.columns), dtype=np.float32)
+        self.beamSteps = np.arange(0.0, OccupancyGridConstants.kMaxRangeInch + self.cellInch, self.cellInch * 0.5)
+
+    def _cells(self, ys, xs):
+        rows = ((ys - self.ymin) // self.cellInch).astype(np.intp)
+        columns = ((xs - self.xmin) // self.cellInch).astype(np.intp)
+        inside = (rows >= 0) & (rows < self.rows) & (columns >= 0) & (columns < self.columns)
+        return rows, columns, inside
+
+    def _occupiedPoints(self):
+        if self.occupiedChanged:
+            self.occupiedChanged = False
+            cells = np.array(sorted(self.occupiedCells), dtype=float).reshape(-1, 2)
+            self.occupiedXY = np.stack([self.xmin + (cells[:, 1] + 0.5) * self.cellInch,
+                                        self.ymin + (cells[:, 0] + 0.5) * self.cellInch], axis=1)
+        return self.occupiedXY
+
+
+def _segmentDistances(points, x0: float, y0: float, x1: float, y1: float):
+    """Distances from each of the points (an N x 2 array) to the segment"""
+    dx, dy = x1 - x0, y1 - y0
+    lengthSquared = dx * dx + dy * dy
+    px, py = points[:, 0] - x0, points[:, 1] - y0
+    if lengthSquared == 0:
+        return np.hypot(px, py)
+    t = np.clip((px * dx + py * dy) / lengthSquared, 0.0, 1.0)
+    return np.hypot(px - t * dx, py - t * dy)
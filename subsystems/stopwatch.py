@@ -1,22 +1,129 @@
+import csv
+import math
+from array import array
+
 import commands2
-from wpilib import SmartDashboard, Timer
+
+from utils.clock import clock
+from utils.log import getLogger
+from utils.telemetry import telemetry
+
+log = getLogger(__name__)
 
 
 class Stopwatch(commands2.Subsystem):
+    """
+    Race timing: start(), then split() at every waypoint, then stop().
+    Every finished run is kept in the history, so min/mean/p90 of the lap and split times can be compared
+    between code changes (see statistics() and exportCsv()), instead of looking at just one run
+    """
+
     def __init__(self, name: str):
         super().__init__()
         self.started = None
+        self.lastElapsed = None  # (seconds between the last start and stop)
         self.name = name
-        SmartDashboard.putNumber(self.name, -1)
+        self.telemetryElapsed = telemetry.number(self.name, period=0.1, initial=-1)
+        self.telemetrySplit = telemetry.number(self.name + "-split", initial=-1)
+        self.telemetryMin = telemetry.number(self.name + "-min", initial=-1)
+        self.telemetryMean = telemetry.number(self.name + "-mean", initial=-1)
+        self.telemetryP90 = telemetry.number(self.name + "-p90", initial=-1)
+
+        # splits of the run in progress (seconds since start)
+        self.currentSplits = array("d")
+
+        # history of finished runs: lap time of run i is laps[i],
+        # and its splits are splitTimes[splitEnd[i - 1]:splitEnd[i]] (see runSplits())
+        self.laps = array("d")
+        self.splitTimes = array("d")
+        self.splitEnd = array("l")
 
     def periodic(self):
         if self.started is not None:
-            elapsed = Timer.getFPGATimestamp() - self.started
-            SmartDashboard.putNumber(self.name, elapsed)
+            elapsed = clock.now() - self.started
+            self.telemetryElapsed.set(elapsed)
 
     def start(self):
-        self.started = Timer.getFPGATimestamp()
+        self.started = clock.now()
+        self.currentSplits = array("d")
+
+    def split(self):
+        """Record the time since start (for example, when a waypoint was passed)"""
+        if self.started is None:
+            return
+        elapsed = clock.now() - self.started
+        self.currentSplits.append(elapsed)
+        self.telemetrySplit.set(elapsed)
 
     def stop(self):
         self.periodic()
+        if self.started is not None:
+            self.lastElapsed = clock.now() - self.started
+            self.laps.append(self.lastElapsed)
+            self.splitTimes.extend(self.currentSplits)
+            self.splitEnd.append(len(self.splitTimes))
+            self._publishStatistics()
+            log.info("%s: run %d took %.3f seconds, splits %s", self.name, len(self.laps), self.lastElapsed,
+                     [round(s, 3) for s in self.currentSplits])
         self.started = None
+
+    def runCount(self) -> int:
+        return len(self.laps)
+
+    def runSplits(self, run: int) -> array:
+        """:returns: split times (seconds since start) of that finished run"""
+        begin = self.splitEnd[run - 1] if run > 0 else 0
+        return self.splitTimes[begin:self.splitEnd[run]]
+
+    def statistics(self) -> dict:
+        """
+        :returns: {"lap": {"runs", "min", "mean", "p90"}, "split1": {...}, "split2": {...}, ...} over all finished runs
+          (split k only counts the runs which got that far)
+        """
+        result = {}
+        if not self.laps:
+            return result
+        result["lap"] = _describe(self.laps)
+        splitCount = max(len(self.runSplits(run)) for run in range(len(self.laps)))
+        for k in range(splitCount):
+            values = [splits[k] for splits in map(self.runSplits, range(len(self.laps))) if len(splits) > k]
+            result[f"split{k + 1}"] = _describe(values)
+        return result
+
+    def exportCsv(self, path: str) -> None:
+        """Write one row per finished run: run number, lap time and the split times"""
+        splitCount = max((len(self.runSplits(run)) for run in range(len(self.laps))), default=0)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["run", "lap"] + [f"split{k + 1}" for k in range(splitCount)])
+            for run in range(len(self.laps)):
+                writer.writerow([run + 1, f"{self.laps[run]:.4f}"] + [f"{s:.4f}" for s in self.runSplits(run)])
+
+    def clearHistory(self) -> None:
+        self.laps = array("d")
+        self.splitTimes = array("d")
+        self.splitEnd = array("l")
+
+    def _publishStatistics(self) -> None:
+        lap = _describe(self.laps)
+        self.telemetryMin.set(lap["min"])
+        self.telemetryMean.set(lap["mean"])
+        self.telemetryP90.set(lap["p90"])
+
+
+def _describe(values) -> dict:
+    # (a few dozen runs at most: plain Python is fast enough, and the robot doesn't have to import numpy for it)
+    return {
+        "runs": len(values),
+        "min": min(values),
+        "mean": math.fsum(values) / len(values),
+        "p90": _percentile(sorted(values), 90),
+    }
+
+
+def _percentile(ordered, percent: float) -> float:
+    # (linear interpolation between the closest ranks, same as numpy.percentile)
+    position = (len(ordered) - 1) * percent / 100
+    below = int(position)
+    above = min(below + 1, len(ordered) - 1)
+    return ordered[below] + (ordered[above] - ordered[below]) * (position - below)
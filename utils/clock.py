@@ -0,0 +1,89 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+The one clock which all time-dependent robot code should use (instead of calling Timer.getFPGATimestamp()):
+
+    from utils.clock import clock
+    now = clock.now()  # the time of the current tick (read once per tick, in robotPeriodic)
+
+Simulations can switch it to a virtual clock, which only moves when stepped (faster than real time, reproducible):
+
+    virtual = clock.useVirtual()
+    virtual.step(0.02)
+    clock.tick()
+"""
+
+from wpilib import Timer
+
+
+class FPGAClock:
+    """The real clock: FPGA timestamp (in the simulator: the HAL simulated time)"""
+
+    def read(self) -> float:
+        return Timer.getFPGATimestamp()
+
+
+class VirtualClock:
+    """A clock that only moves when step() is called"""
+
+    def __init__(self, start: float = None, stepHal: bool = True):
+        """
+        :param start: starting time, by default the current FPGA time (so the timestamps keep increasing)
+        :param stepHal: also pause and step the HAL simulated time (so that wpilib.Timer and withTimeout()
+          of commands, which read the HAL time, stay in sync with this clock)
+        """
+        self.stepHal = stepHal
+        if stepHal:
+            from wpilib.simulation import pauseTiming
+            pauseTiming()
+        self.time = Timer.getFPGATimestamp() if start is None else start
+
+    def read(self) -> float:
+        return self.time
+
+    def step(self, seconds: float) -> None:
+        if self.stepHal:
+            from wpilib.simulation import stepTiming
+            stepTiming(seconds)
+        self.time += seconds
+
+
+class Clock:
+    def __init__(self, backend=None):
+        self.backend = backend or FPGAClock()
+        self.cached = None
+
+    def tick(self) -> float:
+        """Read the clock for this tick (call once at the start of each loop, robotPeriodic does it)"""
+        self.cached = self.backend.read()
+        return self.cached
+
+    def now(self) -> float:
+        """The time of the current tick (same value for every caller in the same tick)"""
+        cached = self.cached
+        return cached if cached is not None else self.tick()
+
+    def read(self) -> float:
+        """The time right now, not cached (for code running in other threads, or measuring inside a tick)"""
+        return self.backend.read()
+
+    def setBackend(self, backend) -> None:
+        self.backend = backend
+        self.cached = None
+
+    def useVirtual(self, stepHal: bool = True) -> VirtualClock:
+        """Switch to a virtual clock (if not yet virtual), and return it (so it can be stepped)"""
+        if not isinstance(self.backend, VirtualClock):
+            self.setBackend(VirtualClock(stepHal=stepHal))
+        return self.backend
+
+    def useFPGA(self) -> None:
+        if not isinstance(self.backend, FPGAClock):
+            self.setBackend(FPGAClock())
+
+
+clock = Clock()
@@ -0,0 +1,189 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Flight recorder: one fixed-size binary record per scheduler tick, written into a preallocated memory-mapped file.
+
+To analyze a log later (with NumPy, without copying it into memory):
+    from utils.flightrecorder import readLog, readCommandNames
+    log = readLog("logs/flight-20261018-101500-0000.xrprec")
+    print(log["timestamp"], log["leftSpeed"], readCommandNames(log.filename))
+"""
+
+import json
+import mmap
+import os
+import struct
+import time
+
+import commands2
+
+# (field name, struct code): the same list describes the file records to `struct` and to NumPy
+kRecordFields = (
+    ("timestamp", "d"),
+    ("leftEncoderCount", "i"),  # raw, as counted by the encoders
+    ("rightEncoderCount", "i"),
+    ("leftDistance", "f"),  # what the odometry got (inches, minus the wheel slip, see Drivetrain slipControl)
+    ("rightDistance", "f"),
+    ("gyroAngleX", "f"),
+    ("gyroAngleY", "f"),
+    ("gyroAngleZ", "f"),
+    ("gyroRateZ", "f"),
+    ("accelX", "f"),
+    ("accelY", "f"),
+    ("accelZ", "f"),
+    ("distanceToObstacle", "f"),
+    ("leftReflectance", "f"),
+    ("rightReflectance", "f"),
+    ("leftSpeed", "f"),  # commanded (after the acceleration limit)
+    ("rightSpeed", "f"),
+    ("leftOutput", "f"),  # actually sent to the motors (after the sigma-delta modulation)
+    ("rightOutput", "f"),
+    ("poseX", "f"),
+    ("poseY", "f"),
+    ("poseHeadingDegrees", "f"),
+    ("commandId", "h"),  # which command was using the drivetrain (-1 = none), see readCommandNames()
+    ("reserved", "h"),
+)
+kRecord = struct.Struct("<" + "".join(code for _, code in kRecordFields))
+
+kMagic = b"XRPREC02"
+kHeader = struct.Struct("<8sIIQ")  # magic, header size, record size, record count
+kHeaderSize = 64
+
+
+class FlightRecorder:
+    def __init__(self, drivetrain, directory: str = "logs", prefix: str = "flight", maxBytes: int = 16 << 20):
+        """
+        :param drivetrain: the Drivetrain to record
+        :param directory: where to put the log files
+        :param prefix: log file names start with this
+        :param maxBytes: when a file gets this big, the recorder continues in the next file
+        """
+        self.drivetrain = drivetrain
+        self.scheduler = commands2.CommandScheduler.getInstance()
+        self.directory = directory
+        self.prefix = prefix + time.strftime("-%Y%m%d-%H%M%S")
+        self.capacity = max(1, (maxBytes - kHeaderSize) // kRecord.size)
+        self.commandIds = {}
+        self.fileNumber = -1
+        self.file = None
+        self.buffer = None
+        self.path = None
+        self.count = 0
+        # (every tick gets recorded, so every sensor has to be read every tick)
+        self.subscriptions = [drivetrain.sensors.subscribe(name)
+                              for name in ("rangefinder", "left-reflectance", "right-reflectance")]
+        os.makedirs(directory, exist_ok=True)
+        self._openNextFile()
+
+    def record(self) -> None:
+        """Append one record (call once per tick, after the scheduler ran)"""
+        if self.count >= self.capacity:
+            self._openNextFile()
+        drivetrain = self.drivetrain
+        frame = drivetrain.getFrame()
+        command = self.scheduler.requiring(drivetrain)
+        commandId = -1 if command is None else self._commandId(command)
+        kRecord.pack_into(
+            self.buffer, kHeaderSize + self.count * kRecord.size,
+            frame.timestamp,
+            drivetrain.getLeftEncoderCount(),
+            drivetrain.getRightEncoderCount(),
+            frame.leftDistance,
+            frame.rightDistance,
+            drivetrain.getGyroAngleX(),
+            drivetrain.getGyroAngleY(),
+            drivetrain.getGyroAngleZ(),
+            frame.gyroRateZ,
+            drivetrain.getAccelX(),
+            drivetrain.getAccelY(),
+            drivetrain.getAccelZ(),
+            frame.distanceToObstacle,
+            frame.leftReflectance,
+            frame.rightReflectance,
+            drivetrain.leftSpeed,
+            drivetrain.rightSpeed,
+            drivetrain.leftModulator.output,
+            drivetrain.rightModulator.output,
+            frame.x,
+            frame.y,
+            frame.headingDegrees,
+            commandId,
+            0,
+        )
+        self.count += 1
+        kHeader.pack_into(self.buffer, 0, kMagic, kHeaderSize, kRecord.size, self.count)
+
+    def shutdown(self) -> None:
+        """Close the log file and stop reading the sensors for the recorder"""
+        self.close()
+        for subscription in self.subscriptions:
+            subscription.cancel()
+        self.subscriptions = []
+
+    def close(self) -> None:
+        """Close the current log file (the sensor subscriptions stay, see shutdown())"""
+        if self.buffer is not None:
+            self.buffer.flush()
+            self.buffer.close()
+            self.file.truncate(kHeaderSize + self.count * kRecord.size)  # (drop the unused preallocated part)
+            self.file.close()
+            self.buffer = None
+            self.file = None
+
+    def _commandId(self, command) -> int:
+        name = command.getName()
+        commandId = self.commandIds.get(name)
+        if commandId is None:
+            commandId = self.commandIds[name] = len(self.commandIds)
+            self._writeCommandNames()  # (only happens when a new kind of command shows up)
+        return commandId
+
+    def _writeCommandNames(self) -> None:
+        with open(self.path + ".commands.json", "w") as f:
+            json.dump({str(i): name for name, i in self.commandIds.items()}, f)
+
+    def _openNextFile(self) -> None:
+        self.close()
+        self.fileNumber += 1
+        self.path = os.path.join(self.directory, f"{self.prefix}-{self.fileNumber:04d}.xrprec")
+        size = kHeaderSize + self.capacity * kRecord.size
+        self.file = open(self.path, "w+b")
+        self.file.truncate(size)
+        self.buffer = mmap.mmap(self.file.fileno(), size)
+        self.count = 0
+        kHeader.pack_into(self.buffer, 0, kMagic, kHeaderSize, kRecord.size, 0)
+        self._writeCommandNames()
+
+
+def recordDtype():
+    """The NumPy structured dtype of one record"""
+    import numpy as np
+    return np.dtype([(name, "<" + code) for name, code in kRecordFields])
+
+
+def readLog(path: str):
+    """
+    :returns: all records of the log file, as a read-only NumPy structured array mapped from the file (zero-copy)
+    """
+    import numpy as np
+    with open(path, "rb") as f:
+        magic, headerSize, recordSize, count = kHeader.unpack(f.read(kHeader.size))
+    if magic != kMagic or recordSize != kRecord.size:
+        raise ValueError(f"{path} is not a flight recorder log of this version")
+    if count == 0:
+        return np.zeros(0, dtype=recordDtype())
+    return np.memmap(path, dtype=recordDtype(), mode="r", offset=headerSize, shape=(count,))
+
+
+def readCommandNames(path: str) -> dict:
+    """:returns: {commandId: command name} for the log file"""
+    try:
+        with open(path + ".commands.json") as f:
+            return {int(i): name for i, name in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
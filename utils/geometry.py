@@ -0,0 +1,35 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Plain-float geometry for the control loops of commands (no wpimath objects made on every tick):
+positions are x, y in inches and directions are degrees counterclockwise, like in SensorFrame.x/y/headingDegrees.
+"""
+
+import math
+
+atan2 = math.atan2
+hypot = math.hypot
+kDegreesPerRadian = 180.0 / math.pi
+
+
+def wrapDegrees(degrees: float) -> float:
+    """:returns: the same angle, between -180 and +180 degrees"""
+    return (degrees + 180.0) % 360.0 - 180.0
+
+
+def headingError(targetDegrees: float, currentDegrees: float) -> float:
+    """:returns: how many degrees to turn from current to target direction, the short way (positive = left)"""
+    return (targetDegrees - currentDegrees + 180.0) % 360.0 - 180.0
+
+
+def directionTo(x0: float, y0: float, x1: float, y1: float) -> float:
+    """:returns: direction from point 0 to point 1, in degrees (0 if it's the same point)"""
+    return atan2(y1 - y0, x1 - x0) * kDegreesPerRadian
+
+
+def distance(x0: float, y0: float, x1: float, y1: float) -> float:
+    return hypot(x1 - x0, y1 - y0)
@@ -0,0 +1,200 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+A tiny logger for code running inside the 20ms scheduler loop, where print() can stall the robot.
+
+Usage:
+    log = getLogger(__name__)
+    log.debug("%s degrees remaining, %s turn speed", degreesRemaining, turnSpeed)
+
+ - a log call only stores (format, args) into a preallocated ring buffer, the text is formatted later
+ - a background thread drains the buffer to stdout (or to a file, see configure())
+ - a call below the logger's level returns immediately, so disabled debug lines cost almost nothing
+ - levels can be set per module: setLevel("commands.aimtodirection", DEBUG)
+"""
+
+import atexit
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+_levelNames = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class RingLog:
+    def __init__(self, capacity: int = 4096, output=None, level: int = INFO, drainPeriod: float = 0.05):
+        """
+        :param capacity: how many log lines can wait in the buffer (when it is full, new lines are dropped)
+        :param output: a stream with .write(), or a file name (default: sys.stdout)
+        :param level: the default level for modules which did not get their own level
+        :param drainPeriod: how often (in seconds) the background thread writes out the buffer
+        """
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.head = 0  # next slot to write (only changed under writeLock)
+        self.tail = 0  # next slot to drain (only changed by the draining thread)
+        self.dropped = 0
+        self.writeLock = threading.Lock()
+        self.drainLock = threading.Lock()
+        self.drainPeriod = drainPeriod
+        self.output = None
+        self.ownsOutput = False
+        self.setOutput(output)
+        self.defaultLevel = level
+        self.levels = {}
+        self.loggers = {}
+        self.thread = None
+        self.started = time.perf_counter()
+
+    def getLogger(self, name: str) -> "Logger":
+        logger = self.loggers.get(name)
+        if logger is None:
+            logger = Logger(self, name, self._levelFor(name))
+            self.loggers[name] = logger
+        return logger
+
+    def setLevel(self, name: str, level: int) -> None:
+        """Set the level for a module and all its submodules (an empty name sets the default level)"""
+        if name:
+            self.levels[name] = level
+        else:
+            self.defaultLevel = level
+        for logger in self.loggers.values():
+            logger.level = self._levelFor(logger.name)
+
+    def setOutput(self, output) -> None:
+        self.flush()
+        if self.ownsOutput:
+            self.output.close()
+        if isinstance(output, str):
+            self.output = open(output, "a", buffering=65536)
+            self.ownsOutput = True
+        else:
+            self.output = output if output is not None else sys.stdout
+            self.ownsOutput = False
+
+    def append(self, level: int, name: str, fmt: str, args: tuple) -> None:
+        with self.writeLock:
+            head = self.head
+            if head - self.tail >= self.capacity:
+                self.dropped += 1
+                return
+            self.slots[head % self.capacity] = (time.perf_counter(), level, name, fmt, args)
+            self.head = head + 1
+        if self.thread is None:
+            self._startThread()
+
+    def flush(self) -> None:
+        """Write out everything that is in the buffer now (from the calling thread)"""
+        with self.drainLock:
+            head = self.head
+            if self.tail == head and not self.dropped:
+                return
+            lines = []
+            while self.tail < head:
+                index = self.tail % self.capacity
+                entry = self.slots[index]
+                self.slots[index] = None
+                self.tail += 1
+                lines.append(self._format(entry))
+            if self.dropped:
+                lines.append(f"[log] {self.dropped} lines dropped (log buffer full)\n")
+                self.dropped = 0
+            try:
+                self.output.write("".join(lines))
+                self.output.flush()
+            except ValueError:
+                pass  # output already closed at exit
+
+    def _format(self, entry) -> str:
+        timestamp, level, name, fmt, args = entry
+        try:
+            message = fmt % args if args else fmt
+        except (TypeError, ValueError) as e:
+            message = f"{fmt!r} % {args!r} ({e})"
+        return f"{timestamp - self.started:10.3f} {_levelNames.get(level, level)} {name}: {message}\n"
+
+    def _levelFor(self, name: str) -> int:
+        while name:
+            level = self.levels.get(name)
+            if level is not None:
+                return level
+            name = name.rpartition(".")[0]
+        return self.defaultLevel
+
+    def _startThread(self) -> None:
+        with self.drainLock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._drainForever, name="ring-log", daemon=True)
+            self.thread.start()
+        atexit.register(self.flush)
+
+    def _drainForever(self) -> None:
+        while True:
+            time.sleep(self.drainPeriod)
+            self.flush()
+
+
+class Logger:
+    __slots__ = ("ringLog", "name", "level")
+
+    def __init__(self, ringLog: RingLog, name: str, level: int):
+        self.ringLog = ringLog
+        self.name = name
+        self.level = level
+
+    def isEnabledFor(self, level: int) -> bool:
+        return level >= self.level
+
+    def debug(self, fmt: str, *args) -> None:
+        if self.level <= DEBUG:
+            self.ringLog.append(DEBUG, self.name, fmt, args)
+
+    def info(self, fmt: str, *args) -> None:
+        if self.level <= INFO:
+            self.ringLog.append(INFO, self.name, fmt, args)
+
+    def warning(self, fmt: str, *args) -> None:
+        if self.level <= WARNING:
+            self.ringLog.append(WARNING, self.name, fmt, args)
+
+    def error(self, fmt: str, *args) -> None:
+        if self.level <= ERROR:
+            self.ringLog.append(ERROR, self.name, fmt, args)
+
+
+# the log used by the whole robot program
+ringLog = RingLog()
+
+
+def getLogger(name: str) -> Logger:
+    return ringLog.getLogger(name)
+
+
+def setLevel(name: str, level: int) -> None:
+    ringLog.setLevel(name, level)
+
+
+def configure(output=None, level: int = None) -> None:
+    """
+    :param output: a stream or a file name to write the log to
+    :param level: the default level
+    """
+    if output is not None:
+        ringLog.setOutput(output)
+    if level is not None:
+        ringLog.setLevel("", level)
+
+
+def flush() -> None:
+    ringLog.flush()
@@ -0,0 +1,180 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Opt-in measurement of where the 20ms scheduler loop time goes.
+
+Subsystem periodic() and command initialize/execute/isFinished/end calls get wrapped with a timer,
+and each of them records its latency into a fixed-bucket histogram (no allocation per sample).
+"""
+
+import functools
+import math
+import time
+from array import array
+
+from utils import log
+from utils.telemetry import telemetry
+
+logger = log.getLogger(__name__)
+
+kCommandMethods = ("initialize", "execute", "isFinished", "end")
+
+
+class Histogram:
+    """Latency histogram with fixed, geometrically spaced buckets: 4 buckets per doubling, from 1us to ~16s"""
+    kSmallest = 1e-6
+    kBucketsPerDoubling = 4
+    kBuckets = 98
+
+    def __init__(self):
+        self.counts = array("l", [0] * self.kBuckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        if seconds > self.kSmallest:
+            bucket = 1 + int(math.log2(seconds / self.kSmallest) * self.kBucketsPerDoubling)
+            if bucket >= self.kBuckets:
+                bucket = self.kBuckets - 1
+        else:
+            bucket = 0
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """:returns: upper edge (in seconds) of the bucket where the p-th percentile falls"""
+        if self.count == 0:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for bucket, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n > 0:
+                return min(self._upperEdge(bucket), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self) -> None:
+        for bucket in range(self.kBuckets):
+            self.counts[bucket] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _upperEdge(self, bucket: int) -> float:
+        return self.kSmallest * 2.0 ** (bucket / self.kBucketsPerDoubling)
+
+
+class LoopTiming:
+    def __init__(self, period: float = 0.02, publishPeriod: float = 1.0):
+        """
+        :param period: the loop period, a loop taking longer than this is counted as an overrun
+        :param publishPeriod: how often to publish the summary to the dashboard (seconds)
+        """
+        self.period = period
+        self.publishPeriod = publishPeriod
+        self.loop = Histogram()
+        self.overruns = 0
+        self.histograms = {}
+        self.loopStart = None
+        self.lastPublished = time.perf_counter()
+        self.telemetryChannels = {}
+
+    def instrumentSubsystem(self, subsystem, name: str = None) -> None:
+        """Time the periodic() calls of this subsystem instance"""
+        name = name or subsystem.getName()
+        method = subsystem.periodic
+        if getattr(method, "_loopTiming", None) is self:
+            return  # already instrumented
+        subsystem.periodic = self._timed(f"{name}.periodic", method)
+
+    def instrumentCommandClass(self, commandClass) -> None:
+        """Time the initialize/execute/isFinished/end calls of every instance of this command class"""
+        for methodName in kCommandMethods:
+            method = commandClass.__dict__.get(methodName)
+            if method is None or getattr(method, "_loopTiming", None) is self:
+                continue  # not defined by this class (or already instrumented)
+            setattr(commandClass, methodName, self._timed(f"{commandClass.__name__}.{methodName}", method))
+
+    def startLoop(self) -> None:
+        self.loopStart = time.perf_counter()
+
+    def endLoop(self) -> None:
+        now = time.perf_counter()
+        if self.loopStart is None:
+            return
+        elapsed = now - self.loopStart
+        self.loop.record(elapsed)
+        if elapsed > self.period:
+            self.overruns += 1
+        if now - self.lastPublished >= self.publishPeriod:
+            self.lastPublished = now
+            self.publish()
+
+    def publish(self) -> None:
+        """Put the latest p50/p99/max numbers (in milliseconds) on the dashboard"""
+        self._channel("loop-timing/overruns").set(self.overruns)
+        for name, histogram in self._allHistograms():
+            self._channel(f"loop-timing/{name}/p50-ms").set(histogram.percentile(50) * 1000)
+            self._channel(f"loop-timing/{name}/p99-ms").set(histogram.percentile(99) * 1000)
+            self._channel(f"loop-timing/{name}/max-ms").set(histogram.max * 1000)
+
+    def summary(self) -> list:
+        """:returns: one line of text per timed call, the slowest (by p99) first"""
+        lines = [f"loop timing: {self.loop.count} loops, {self.overruns} overruns (>{self.period * 1000:.0f}ms)"]
+        rows = sorted(self._allHistograms(), key=lambda item: -item[1].percentile(99))
+        for name, histogram in rows:
+            lines.append(f"  {name:32s} n={histogram.count:7d}  p50={histogram.percentile(50) * 1000:7.3f}ms"
+                         f"  p99={histogram.percentile(99) * 1000:7.3f}ms  max={histogram.max * 1000:7.3f}ms")
+        return lines
+
+    def dump(self) -> None:
+        """Write the summary to the log"""
+        for line in self.summary():
+            logger.info("%s", line)
+
+    def reset(self) -> None:
+        self.loop.reset()
+        self.overruns = 0
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def _allHistograms(self):
+        yield "loop", self.loop
+        for name, histogram in self.histograms.items():
+            if histogram.count:
+                yield name, histogram
+
+    def _channel(self, name):
+        channel = self.telemetryChannels.get(name)
+        if channel is None:
+            channel = self.telemetryChannels[name] = telemetry.number(name)
+        return channel
+
+    def _timed(self, name: str, method):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        record = histogram.record
+        perf_counter = time.perf_counter
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record(perf_counter() - start)
+
+        timed._loopTiming = self
+        return timed
@@ -0,0 +1,90 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+import math
+from array import array
+
+
+class PoseHistory:
+    """
+    Where was the robot at time t? A ring buffer of the last `capacity` (timestamp, x, y, heading) samples,
+    kept in preallocated arrays (nothing gets allocated per sample), with interpolated lookup in O(log n)
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.timestamps = array("d", [0.0] * capacity)
+        self.xs = array("d", [0.0] * capacity)
+        self.ys = array("d", [0.0] * capacity)
+        self.headings = array("d", [0.0] * capacity)  # degrees
+        self.oldest = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def clear(self) -> None:
+        self.oldest = 0
+        self.size = 0
+
+    def add(self, timestamp: float, x: float, y: float, headingDegrees: float) -> None:
+        """Add a sample (timestamps must be increasing, an older or equal timestamp replaces the newest sample)"""
+        if self.size and timestamp <= self.timestamps[self._index(self.size - 1)]:
+            index = self._index(self.size - 1)
+        elif self.size < self.capacity:
+            index = self._index(self.size)
+            self.size += 1
+        else:
+            index = self.oldest  # overwrite the oldest sample
+            self.oldest = (self.oldest + 1) % self.capacity
+        self.timestamps[index] = timestamp
+        self.xs[index] = x
+        self.ys[index] = y
+        self.headings[index] = headingDegrees
+
+    def oldestTimestamp(self) -> float:
+        return self.timestamps[self.oldest] if self.size else math.nan
+
+    def newestTimestamp(self) -> float:
+        return self.timestamps[self._index(self.size - 1)] if self.size else math.nan
+
+    def lookup(self, timestamp: float):
+        """
+        :returns: (x, y, headingDegrees) at that time, interpolated between the two nearest samples
+          (times outside of the history get the oldest or the newest sample; None if the history is empty)
+        """
+        size = self.size
+        if size == 0:
+            return None
+        timestamps = self.timestamps
+
+        # binary search for the first sample at or after the timestamp
+        low, high = 0, size
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[self._index(middle)] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return self._sample(self._index(0))
+        if low == size:
+            return self._sample(self._index(size - 1))
+
+        before, after = self._index(low - 1), self._index(low)
+        t0, t1 = timestamps[before], timestamps[after]
+        fraction = (timestamp - t0) / (t1 - t0)
+        h0 = self.headings[before]
+        turn = (self.headings[after] - h0 + 180.0) % 360.0 - 180.0  # shortest way around
+        return (self.xs[before] + (self.xs[after] - self.xs[before]) * fraction,
+                self.ys[before] + (self.ys[after] - self.ys[before]) * fraction,
+                (h0 + turn * fraction + 180.0) % 360.0 - 180.0)
+
+    def _index(self, i: int) -> int:
+        return (self.oldest + i) % self.capacity
+
+    def _sample(self, index: int):
+        return self.xs[index], self.ys[index], self.headings[index]
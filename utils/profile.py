@@ -0,0 +1,54 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+import math
+
+
+class TrapezoidProfile:
+    """
+    Velocity profile for moving a distance from standstill to standstill: accelerate at maxAcceleration,
+    cruise at maxVelocity, decelerate at maxAcceleration (a triangle instead, if the distance is too short to cruise)
+    """
+    __slots__ = ("distance", "direction", "maxVelocity", "maxAcceleration",
+                 "accelerationTime", "cruiseTime", "duration", "peakVelocity")
+
+    def __init__(self, distance: float, maxVelocity: float, maxAcceleration: float):
+        """
+        :param distance: how far to go (negative = backwards)
+        :param maxVelocity: cruising speed (distance units per second, positive)
+        :param maxAcceleration: (distance units per second squared, positive)
+        """
+        self.distance = abs(distance)
+        self.direction = -1.0 if distance < 0 else 1.0
+        self.maxVelocity = maxVelocity
+        self.maxAcceleration = maxAcceleration
+
+        # can we reach the cruising speed before we have to start slowing down?
+        self.peakVelocity = min(maxVelocity, math.sqrt(self.distance * maxAcceleration))
+        self.accelerationTime = self.peakVelocity / maxAcceleration
+        accelerationDistance = 0.5 * maxAcceleration * self.accelerationTime ** 2
+        self.cruiseTime = (self.distance - 2 * accelerationDistance) / self.peakVelocity if self.peakVelocity > 0 else 0
+        self.duration = 2 * self.accelerationTime + self.cruiseTime
+
+    def sample(self, t: float):
+        """:returns: (position, velocity, acceleration) at time t after the start"""
+        a, v, ta = self.maxAcceleration, self.peakVelocity, self.accelerationTime
+        if t <= 0:
+            return 0.0, 0.0, 0.0
+        if t < ta:
+            position, velocity, acceleration = 0.5 * a * t * t, a * t, a
+        elif t < ta + self.cruiseTime:
+            position, velocity, acceleration = 0.5 * a * ta * ta + v * (t - ta), v, 0.0
+        elif t < self.duration:
+            remaining = self.duration - t
+            position, velocity, acceleration = self.distance - 0.5 * a * remaining * remaining, a * remaining, -a
+        else:
+            position, velocity, acceleration = self.distance, 0.0, 0.0
+        d = self.direction
+        return d * position, d * velocity, d * acceleration
+
+    def isFinished(self, t: float) -> bool:
+        return t >= self.duration
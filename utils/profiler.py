@@ -0,0 +1,176 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+A sampling profiler which can be switched on and off while the robot runs (no restart needed):
+ - from the dashboard: the "profiler" boolean in SmartDashboard (see poll(), called by robotPeriodic)
+ - from the joystick: a button bound to profiler.toggle (see RobotContainer.configureButtonBindings)
+
+While it runs, a background thread looks at the stack of the robot loop thread every few milliseconds.
+When it stops, the samples get written into logs/profile-<time>-<number>.folded, in the "folded stacks" format
+of flamegraph tools (one line per stack: "frame;frame;frame count"), for example:
+
+    flamegraph.pl logs/profile-20261018-101500-0000.folded > profile.svg
+    (or drop the file into https://www.speedscope.app)
+
+The first frame of every stack is the command or subsystem which was running, like "command:GoToPoint".
+While stopped, it costs one NetworkTables read per tick.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import commands2
+import ntcore
+
+from utils.log import getLogger
+
+log = getLogger(__name__)
+
+# samples inside these methods get attributed to the command or subsystem that the method belongs to
+kAttributedMethods = frozenset(("initialize", "execute", "isFinished", "end", "periodic", "simulationPeriodic"))
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.002, directory: str = "logs", prefix: str = "profile",
+                 entryName: str = "profiler"):
+        """
+        :param interval: seconds between the samples
+        :param directory: where to write the .folded files
+        :param entryName: the boolean in SmartDashboard which starts (true) and stops (false) the profiler
+        """
+        self.interval = interval
+        self.directory = directory
+        self.prefix = prefix
+        self.entryName = entryName
+        self.entry = None
+        self.thread = None
+        self.stopEvent = None
+        self.lastPath = None
+        self.fileNumber = 0
+        self.switchInterval = None
+
+    def isRunning(self) -> bool:
+        return self.thread is not None
+
+    def start(self) -> None:
+        """Start sampling the thread which calls this (the robot loop thread)"""
+        if self.thread is not None:
+            return
+        self.stopEvent = threading.Event()
+        name = f"{self.prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{self.fileNumber:04d}.folded"
+        path = os.path.join(self.directory, name)
+        self.fileNumber += 1
+        # (the sampler needs the GIL to look at the stack: by default the loop thread would only let it go
+        #  every 5ms, or when it sleeps, so most samples would land at the end of the tick)
+        self.switchInterval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.switchInterval, self.interval / 4))
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True,
+                                       args=(threading.get_ident(), self.stopEvent, path))
+        self.thread.start()
+        self._setEntry(True)
+        log.info("profiler: started, sampling every %.1f ms", self.interval * 1000)
+
+    def stop(self) -> None:
+        """Stop sampling (the samples get written to a file by the profiler thread, not to stall the loop)"""
+        if self.thread is None:
+            return
+        self.stopEvent.set()
+        sys.setswitchinterval(self.switchInterval)
+        self.thread = None
+        self.stopEvent = None
+        self._setEntry(False)
+
+    def toggle(self) -> None:
+        if self.isRunning():
+            self.stop()
+        else:
+            self.start()
+
+    def poll(self) -> None:
+        """Start or stop, if somebody flipped the dashboard boolean (call once per tick)"""
+        if self.entry is None:
+            table = ntcore.NetworkTableInstance.getDefault().getTable("SmartDashboard")
+            self.entry = table.getBooleanTopic(self.entryName).getEntry(False)
+            self.entry.set(self.isRunning())
+        if self.entry.get() != self.isRunning():
+            self.toggle()
+
+    def _setEntry(self, value: bool) -> None:
+        # (so that the next poll() doesn't undo a start or stop which came from the joystick)
+        if self.entry is not None:
+            self.entry.set(value)
+
+    def _run(self, threadId: int, stopEvent: threading.Event, path: str) -> None:
+        counts = {}
+        samples = 0
+        started = time.perf_counter()
+        currentFrames = sys._current_frames
+        attributed = kAttributedMethods
+        while not stopEvent.wait(self.interval):
+            frame = currentFrames().get(threadId)
+            if frame is None:
+                break  # (that thread is gone)
+            codes = []
+            owner = None
+            while frame is not None:
+                code = frame.f_code
+                codes.append(code)
+                if owner is None and code.co_name in attributed:
+                    owner = code  # (the innermost one: a command group's execute calls its commands' execute)
+                frame = frame.f_back
+            key = (owner, tuple(codes))
+            counts[key] = counts.get(key, 0) + 1
+            samples += 1
+        self._write(path, counts, samples, time.perf_counter() - started)
+
+    def _write(self, path: str, counts: dict, samples: int, seconds: float) -> None:
+        labels = _attributionLabels()  # (now, because some command classes get imported only when first used)
+        os.makedirs(self.directory, exist_ok=True)
+        folded = {}
+        for (owner, codes), count in counts.items():
+            root = "(no command or subsystem)" if owner is None else labels.get(owner) or _classOf(owner)
+            line = ";".join([root] + [_frameName(code) for code in reversed(codes)])
+            folded[line] = folded.get(line, 0) + count
+        with open(path, "w") as f:
+            for line, count in sorted(folded.items()):
+                f.write(f"{line} {count}\n")
+        self.lastPath = path
+        log.info("profiler: %d samples in %.1f seconds written to %s", samples, seconds, path)
+
+
+def _attributionLabels() -> dict:
+    """:returns: {code object of a method: "command:ClassName" or "subsystem:ClassName"} for all the classes"""
+    labels = {}
+    for baseClass, kind in ((commands2.Subsystem, "subsystem"), (commands2.Command, "command")):
+        classes = [baseClass]
+        while classes:
+            cls = classes.pop()
+            classes.extend(cls.__subclasses__())
+            for name in kAttributedMethods:
+                method = cls.__dict__.get(name)
+                while method is not None:
+                    code = getattr(method, "__code__", None)
+                    if code is not None and code.co_name == name:
+                        labels.setdefault(code, f"{kind}:{cls.__name__}")
+                    method = getattr(method, "__wrapped__", None)  # (instrumented by LoopTiming)
+    return labels
+
+
+def _classOf(code) -> str:
+    qualname = getattr(code, "co_qualname", code.co_name)
+    return qualname.rpartition(".")[0] or qualname
+
+
+def _frameName(code) -> str:
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+# the profiler of the robot program
+profiler = SamplingProfiler()
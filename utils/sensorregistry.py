@@ -0,0 +1,115 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Sensors which are only read when somebody needs them.
+
+    registry = SensorRegistry()
+    registry.register("rangefinder", distanceSensor.getDistance)
+    subscription = registry.subscribe("rangefinder", period=0.1, callback=print)  # 10 times per second
+    ...
+    registry.poll(now)  # once per tick: reads only the subscribed channels which are due, once each
+    subscription.cancel()
+    registry.value("rangefinder")  # read now, unless it was already read in this tick
+
+The subscription periods are only for the callbacks (like the dashboard, which needs the values 10 times
+per second): value() never returns anything older than the current tick, whatever the subscriptions are.
+"""
+
+import math
+
+from utils.clock import clock
+
+
+class SensorChannel:
+    __slots__ = ("name", "read", "subscriptions", "value", "timestamp")
+
+    def __init__(self, name: str, read, initial):
+        self.name = name
+        self.read = read
+        self.subscriptions = []
+        self.value = initial
+        self.timestamp = -math.inf  # when the value was read
+
+
+class Subscription:
+    __slots__ = ("registry", "channel", "period", "callback", "due")
+
+    def __init__(self, registry, channel: SensorChannel, period: float, callback):
+        self.registry = registry
+        self.channel = channel
+        self.period = period
+        self.callback = callback
+        self.due = -math.inf
+
+    def cancel(self) -> None:
+        """Stop receiving the values (and if nobody else wants them, stop reading the sensor)"""
+        self.registry._unsubscribe(self)
+
+
+class SensorRegistry:
+    def __init__(self):
+        self.channels = {}
+        self.active = []  # channels which have subscriptions (only these get polled)
+
+    def register(self, name: str, read, initial=math.nan) -> SensorChannel:
+        """
+        :param read: function() -> value, which reads the sensor
+        :param initial: the value until the sensor is read for the first time
+        """
+        assert name not in self.channels, f"sensor channel {name} is already registered"
+        channel = self.channels[name] = SensorChannel(name, read, initial)
+        return channel
+
+    def subscribe(self, name: str, period: float = 0.0, callback=None) -> Subscription:
+        """
+        :param period: how often to read it, in seconds (0 = every tick)
+        :param callback: optional function(value, timestamp), called with every value read for this subscription
+        """
+        channel = self.channels[name]
+        subscription = Subscription(self, channel, period, callback)
+        channel.subscriptions.append(subscription)
+        if channel not in self.active:
+            self.active.append(channel)
+        return subscription
+
+    def isSubscribed(self, name: str) -> bool:
+        return bool(self.channels[name].subscriptions)
+
+    def poll(self, now: float) -> None:
+        """Read each subscribed channel which is due (once), and hand the value to its due subscriptions"""
+        for channel in self.active:
+            due = [s for s in channel.subscriptions if s.due <= now + 1e-6]  # (+1us, for rounding errors)
+            if not due:
+                continue
+            if channel.timestamp < now:
+                channel.value = channel.read()
+                channel.timestamp = now
+            value = channel.value
+            for subscription in due:
+                nextDue = subscription.due + subscription.period  # (keeps the rate steady, unless we fell behind)
+                subscription.due = nextDue if nextDue > now else now + subscription.period
+                if subscription.callback is not None:
+                    subscription.callback(value, now)
+
+    def value(self, name: str):
+        """
+        The value of this channel in the current tick: if it was not read in this tick yet, it gets read now
+        (so at most once per tick, and the first call always reads the sensor)
+        """
+        channel = self.channels[name]
+        now = clock.now()
+        if channel.timestamp < now:
+            channel.value = channel.read()
+            channel.timestamp = now
+        return channel.value
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        channel = subscription.channel
+        if subscription in channel.subscriptions:
+            channel.subscriptions.remove(subscription)
+        if not channel.subscriptions and channel in self.active:
+            self.active.remove(channel)
@@ -0,0 +1,77 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Where does the robot startup time go? Phases and module imports are timed and reported in one log message.
+
+    with startupTiming.phase("RobotContainer()"), startupTiming.trackImports():
+        ...
+    startupTiming.report()
+"""
+
+import builtins
+import contextlib
+import sys
+import threading
+import time
+
+from utils import log
+
+logger = log.getLogger(__name__)
+
+
+class StartupTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []  # (name, seconds)
+        self.imports = {}  # module name -> seconds, including the modules it imported
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases.append((name, time.perf_counter() - start))
+
+    @contextlib.contextmanager
+    def trackImports(self):
+        """Time the first import of every module imported inside this block"""
+        originalImport = builtins.__import__
+        imports = self.imports
+
+        def timedImport(name, globals=None, locals=None, fromlist=(), level=0):
+            if level != 0 or name in sys.modules:
+                return originalImport(name, globals, locals, fromlist, level)
+            start = time.perf_counter()
+            try:
+                return originalImport(name, globals, locals, fromlist, level)
+            finally:
+                imports.setdefault(name, time.perf_counter() - start)
+
+        builtins.__import__ = timedImport
+        try:
+            yield
+        finally:
+            builtins.__import__ = originalImport
+
+    def report(self, top: int = 10) -> list:
+        """Log (and return) the startup timing report: phases in order, and the slowest imports"""
+        lines = [f"startup took {time.perf_counter() - self.started:.3f}s"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:40s} {seconds * 1000:8.1f}ms")
+        slowest = sorted(self.imports.items(), key=lambda item: -item[1])[:top]
+        if slowest:
+            lines.append("  slowest imports (including what they import):")
+            for name, seconds in slowest:
+                lines.append(f"    {name:38s} {seconds * 1000:8.1f}ms")
+        logger.info("%s", "\n".join(lines))
+        return lines
+
+
+startupTiming = StartupTiming()
@@ -0,0 +1,109 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+import math
+
+import ntcore
+
+from utils.clock import clock
+
+
+class Channel:
+    """
+    One dashboard value: the publisher is registered once, and the latest value is only sent
+    when the channel is due (period elapsed) and the value changed by more than the deadband
+    """
+    __slots__ = ("name", "period", "deadband", "publisher", "value", "published", "publishedAt")
+
+    def __init__(self, name: str, publisher, period: float, deadband: float, initial):
+        self.name = name
+        self.publisher = publisher
+        self.period = period
+        self.deadband = deadband
+        self.value = initial
+        self.published = None
+        self.publishedAt = -math.inf
+
+    def set(self, value) -> None:
+        """Remember the latest value, it will be sent at the next flush (if due)"""
+        self.value = value
+
+    def _changed(self) -> bool:
+        return self.value != self.published
+
+    def _flush(self, now: float) -> None:
+        if now - self.publishedAt < self.period or not self._changed():
+            return
+        self.publisher.set(self.value)
+        self.published = self.value
+        self.publishedAt = now
+
+
+class NumberChannel(Channel):
+    __slots__ = ()
+
+    def _changed(self) -> bool:
+        value, published = self.value, self.published
+        if published is None:
+            return True
+        if value != value:  # nan
+            return published == published
+        if published != published:
+            return True
+        return abs(value - published) > self.deadband
+
+
+class Telemetry:
+    """
+    A batched replacement for SmartDashboard.putNumber():
+     - channels are registered once (no topic lookup by name on every tick)
+     - .set() on a channel is cheap, and flush() sends everything which changed, once per tick
+    """
+
+    def __init__(self, tableName: str = "SmartDashboard"):
+        self.tableName = tableName
+        self.table = None
+        self.channels = {}
+        self.channelList = []
+
+    def number(self, name: str, period: float = 0.0, deadband: float = 0.0, initial: float = math.nan) -> NumberChannel:
+        """
+        :param name: the key on the dashboard
+        :param period: publish at most once per this many seconds
+        :param deadband: do not publish if the value changed by less than this much
+        """
+        return self._register(name, NumberChannel, "getDoubleTopic", period, deadband, initial)
+
+    def boolean(self, name: str, period: float = 0.0, initial: bool = False) -> Channel:
+        return self._register(name, Channel, "getBooleanTopic", period, 0.0, initial)
+
+    def string(self, name: str, period: float = 0.0, initial: str = "") -> Channel:
+        return self._register(name, Channel, "getStringTopic", period, 0.0, initial)
+
+    def flush(self, now: float = None) -> None:
+        """Publish all the channels which are due (call once per tick, after the scheduler ran)"""
+        if now is None:
+            now = clock.now()
+        for channel in self.channelList:
+            channel._flush(now)
+
+    def _register(self, name, channelClass, topicGetter, period, deadband, initial):
+        channel = self.channels.get(name)
+        if channel is not None:
+            # (the same name can be registered by many command instances, they will all share one channel)
+            assert isinstance(channel, channelClass), f"telemetry channel {name} already registered with another type"
+            return channel
+        if self.table is None:
+            self.table = ntcore.NetworkTableInstance.getDefault().getTable(self.tableName)
+        publisher = getattr(self.table, topicGetter)(name).publish()
+        channel = channelClass(name, publisher, period, deadband, initial)
+        self.channels[name] = channel
+        self.channelList.append(channel)
+        return channel
+
+
+# the telemetry which the robot flushes at the end of every tick
+telemetry = Telemetry()
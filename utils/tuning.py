@@ -0,0 +1,111 @@
+#
+# Copyright (c) FIRST and other WPILib contributors.
+# Open Source Software; you can modify and/or share it under the terms of
+# the WPILib BSD license file in the root directory of this project.
+#
+
+"""
+Per-robot tuning results (see commands/autotune.py), saved in tuning/<robot name>.json
+and loaded into the constants classes at startup:
+
+    applyTuning(loadTuning())
+
+(the constants classes are marked @tunable: tuned values for a class whose module is not imported yet
+are kept until it is, so applying the tuning at startup doesn't import all the commands)
+"""
+
+import json
+import os
+import sys
+
+from utils.log import getLogger
+
+log = getLogger(__name__)
+
+kTuningDirectory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tuning")
+
+# constants classes which can be tuned, and where they live
+kTunableClasses = {
+    "AimToDirectionConstants": "commands.aimtodirection",
+    "GoToPointConstants": "commands.gotopoint",
+}
+
+defaults = {}  # {"ClassName.kConstant": value before any tuning was applied}
+pending = {}  # {"ClassName.kConstant": value} for the classes which are not imported yet
+
+
+def tuningPath(robot: str = None) -> str:
+    """
+    :param robot: which robot, by default environment variable XRP_ROBOT_NAME
+      (or else the XRP address, HALSIMXRP_HOST: but every XRP has the same default address, so name your robots)
+    """
+    robot = robot or os.environ.get("XRP_ROBOT_NAME") or os.environ.get("HALSIMXRP_HOST", "default")
+    return os.path.join(kTuningDirectory, f"{robot}.json")
+
+
+def loadTuning(path: str = None) -> dict:
+    """:returns: {"ClassName.kConstant": value} saved for this robot (empty, if it was never tuned)"""
+    path = path or tuningPath()
+    try:
+        with open(path) as f:
+            return json.load(f).get("constants", {})
+    except FileNotFoundError:
+        return {}
+    except (ValueError, AttributeError) as e:
+        log.warning("ignoring the tuning file %s, it cannot be read: %s", path, e)
+        return {}
+
+
+def saveTuning(constants: dict, measured: dict = None, path: str = None) -> str:
+    """
+    :param constants: {"ClassName.kConstant": value}
+    :param measured: the measurements these constants came from (saved only for reference)
+    """
+    path = path or tuningPath()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"constants": constants, "measured": measured or {}}, f, indent=2, sort_keys=True)
+    return path
+
+
+def applyTuning(constants: dict) -> None:
+    """
+    Set the tuned values on the constants classes (for example AimToDirectionConstants.kP),
+    or if the module of that class is not imported yet, when it gets imported (see tunable)
+    """
+    for name, value in constants.items():
+        className, _, attribute = name.partition(".")
+        moduleName = kTunableClasses.get(className)
+        if moduleName is None:
+            log.warning("unknown tuned constant %s, ignored", name)
+            continue
+        module = sys.modules.get(moduleName)
+        constantsClass = getattr(module, className, None) if module is not None else None
+        if constantsClass is None:
+            pending[name] = value
+            continue
+        _setConstant(constantsClass, name, value)
+    if constants:
+        log.info("tuned constants applied: %s", constants)
+
+
+def tunable(constantsClass):
+    """Class decorator for the classes in kTunableClasses: sets the tuned values which were waiting for this class"""
+    prefix = constantsClass.__name__ + "."
+    for name in [name for name in pending if name.startswith(prefix)]:
+        _setConstant(constantsClass, name, pending.pop(name))
+    return constantsClass
+
+
+def _setConstant(constantsClass, name: str, value) -> None:
+    attribute = name.partition(".")[2]
+    if not hasattr(constantsClass, attribute):
+        log.warning("unknown tuned constant %s, ignored", name)
+        return
+    defaults.setdefault(name, getattr(constantsClass, attribute))
+    setattr(constantsClass, attribute, value)
+
+
+def defaultValue(name: str, current: float) -> float:
+    """:returns: the value this constant had before tuning (or current, if it was never tuned)"""
+    return defaults.get(name, current)